@@ -1,29 +1,129 @@
 """設定ファイル"""
+import json
 import os
+import socket
 from pathlib import Path
 
 # プロジェクトのベースディレクトリ
 BASE_DIR = Path(__file__).parent
 
+
+def _env_flag(name: str, default: bool) -> bool:
+    """真偽値の環境変数を読む（1/true/yes/on を真、0/false/no/off を偽とする）"""
+    value = os.environ.get(name, "").strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    return default
+
+
+# 各URLは環境変数で上書きできる（load_harness.py のローカルサーバーに向ける場合など）
+
 # 監視対象URL（東京R不動産の検索結果）
 # 賃貸物件、賃料15-30万円、面積40㎡以上
-SEARCH_URL = (
+SEARCH_URL = os.environ.get(
+    "TOKYO_R_SEARCH_URL",
     "https://www.realtokyoestate.co.jp/estate_search.php"
     "?mode=key&display=inline&type%5B%5D=1&k=&type2%5B%5D=1"
-    "&rent_from=15&rent_to=30&building_area_from=40&building_area_to=0"
+    "&rent_from=15&rent_to=30&building_area_from=40&building_area_to=0",
 )
 
 # ベースURL（物件詳細ページのURL生成用）
-BASE_URL = "https://www.realtokyoestate.co.jp"
+BASE_URL = os.environ.get("TOKYO_R_BASE_URL", "https://www.realtokyoestate.co.jp")
 
-# データ保存先
-DATA_DIR = BASE_DIR / "data"
+# データ保存先（環境変数 WATCHER_DATA_DIR で変更可能）
+DATA_DIR = Path(os.environ.get("WATCHER_DATA_DIR", BASE_DIR / "data"))
 PROPERTIES_FILE = DATA_DIR / "properties.json"
 
 # リノベ百貨店の設定
-RENOV_SEARCH_URL = "https://www.renov-depart.jp/sch/sch_list.php"
-RENOV_BASE_URL = "https://www.renov-depart.jp"
+RENOV_SEARCH_URL = os.environ.get("RENOV_SEARCH_URL", "https://www.renov-depart.jp/sch/sch_list.php")
+RENOV_BASE_URL = os.environ.get("RENOV_BASE_URL", "https://www.renov-depart.jp")
 RENOV_PROPERTIES_FILE = DATA_DIR / "renov_properties.json"
+# 検索条件: 間取り 1LDK(203), 2K(205), 2DK(302), 2LDK(303)、家賃15万円〜30万円
+# 間取りごとに分割して並行に検索し、件数が上限に達した条件はその場で賃料帯をさらに分割して取り直す（分割できない場合は打ち切られた結果を使う）
+RENOV_MADORI_CODES = ["203", "205", "302", "303"]
+RENOV_RENT_RANGE = (15, 30)
+# 1回の検索で返る件数の上限（これ以上なら打ち切られているとみなす。0で上限なし）
+RENOV_RESULT_CAP = int(os.environ.get("RENOV_RESULT_CAP", "50"))
+# 同一ホストへの同時接続数
+RENOV_MAX_CONCURRENCY = 3
+# 1回の取得で送る検索リクエスト数の上限（これを超える分割はせず、打ち切られた結果を使う）
+RENOV_MAX_REQUESTS_PER_CYCLE = int(os.environ.get("RENOV_MAX_REQUESTS_PER_CYCLE", "32"))
+RENOV_SHARD_COUNTS_FILE = DATA_DIR / "renov_shard_counts.json"
+
+# サイト横断の重複検出設定
+# 面積の許容差（㎡）と賃料の許容差（比率）、重複とみなす一致度の閾値
+CROSS_SITE_AREA_TOLERANCE = 1.0
+CROSS_SITE_RENT_TOLERANCE = 0.05
+CROSS_SITE_MATCH_THRESHOLD = 0.7
+# 同じ建物の別住戸と区別するための条件
+# 面積がこの差（㎡）以内で一致するか、タイトル・所在地の類似度が下限以上であることを求める
+# （サイトごとにタイトルが異なり、リノベ百貨店には所在地がないため、通常は面積の一致で判定する）
+CROSS_SITE_EXACT_AREA_TOLERANCE = 0.05
+CROSS_SITE_MIN_TEXT_SIMILARITY = 0.6
+# 駅徒歩分数の許容差（分）。両サイトで分かる場合、これを超えて異なれば別物件とみなす
+CROSS_SITE_WALK_TOLERANCE = 1
+
+# キーワード通知の設定
+# プロファイル名 -> 検索クエリのリスト（いずれかのクエリに一致すれば通知）
+# クエリは空白区切りのAND検索、"..." で囲むとフレーズ検索
+# 環境変数 KEYWORD_ALERT_PROFILES にJSONで指定すると上書きできる
+KEYWORD_ALERT_PROFILES = {
+    "ペット可": ["ペット可", "ペット相談"],
+    "天井高": ["天井高"],
+    "ルーフバルコニー": ["ルーフバルコニー"],
+}
+if os.environ.get("KEYWORD_ALERT_PROFILES"):
+    KEYWORD_ALERT_PROFILES = json.loads(os.environ["KEYWORD_ALERT_PROFILES"])
+SEARCH_INDEX_FILE = DATA_DIR / "search_index.json"
+
+# 通勤時間フィルタの設定
+# 基準駅が空の場合はフィルタしない（例: COMMUTE_ORIGIN_STATION=新宿 COMMUTE_MAX_MINUTES=25）
+# 駅座標表はリポジトリに同梱しているため、WATCHER_DATA_DIR に関係なく固定
+STATIONS_FILE = BASE_DIR / "data" / "stations.csv"
+COMMUTE_ORIGIN_STATION = os.environ.get("COMMUTE_ORIGIN_STATION", "")
+COMMUTE_MAX_MINUTES = float(os.environ.get("COMMUTE_MAX_MINUTES", "25"))
+# 所要時間の概算に使う表定速度（km/h）と乗車までの待ち時間（分）
+COMMUTE_TRAIN_SPEED_KMPH = 30.0
+COMMUTE_OVERHEAD_MINUTES = 3.0
+# 駅座標が不明な物件を通知対象に残すか
+COMMUTE_KEEP_UNKNOWN = True
+
+# 掲載履歴の設定（掲載開始・終了・賃料改定のイベントログ）
+HISTORY_FILE = DATA_DIR / "history.jsonl"
+# 集計に使う賃料帯の幅（円）
+HISTORY_RENT_BAND_YEN = 50000
+
+# ローカル配信サーバーの設定（python main.py --serve で常駐する場合のみ起動）
+PUSH_SERVER_HOST = os.environ.get("PUSH_SERVER_HOST", "127.0.0.1")
+PUSH_SERVER_PORT = int(os.environ.get("PUSH_SERVER_PORT", "8765"))
+# 常駐時の監視間隔（秒）
+WATCH_INTERVAL_SECONDS = int(os.environ.get("WATCH_INTERVAL_SECONDS", "900"))
+# SSE購読者ごとの未送信イベントの上限と、無通信時のハートビート間隔（秒）
+PUSH_SUBSCRIBER_QUEUE_SIZE = 1000
+PUSH_HEARTBEAT_SECONDS = 15
+
+# 複数ホストで動かす場合の協調設定（coordination.py を参照）
+# 共有ストアのSQLiteファイル。未設定の場合は協調せずにすべてのサイトを処理する
+COORDINATION_DB = os.environ.get("WATCHER_COORDINATION_DB", "")
+WATCHER_ID = os.environ.get("WATCHER_ID", socket.gethostname())
+# ワーカー・サイトのリース期間（秒）。監視間隔より長くし、これを過ぎると他のワーカーが引き継ぐ
+WORKER_LEASE_SECONDS = int(os.environ.get("WORKER_LEASE_SECONDS", "1800"))
+# 通知済みキーの保持期間（秒）。これを過ぎたキーは削除し、同じ物件が再掲載されれば再び通知する
+NOTIFICATION_KEY_TTL_SECONDS = int(os.environ.get("NOTIFICATION_KEY_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# サムネイル画像の設定（thumbnails.py を参照）
+THUMBNAIL_CACHE_DIR = DATA_DIR / "thumbnails"
+THUMBNAIL_CACHE_MAX_BYTES = 50 * 1024 * 1024
+THUMBNAIL_MAX_SIZE = (480, 480)
+THUMBNAIL_MAX_WORKERS = 4
+# 縮小版サムネイルを外部に公開するURL（配信サーバーの /thumbnails/ をHTTPSで公開している場合に設定）
+# 未設定の場合、通知には元画像のURLを使う
+THUMBNAIL_PUBLIC_BASE_URL = os.environ.get("THUMBNAIL_PUBLIC_BASE_URL", "")
+# 新着通知を画像付きのFlexメッセージで送るか（既定はテキストのみ）
+# 有効にすると、THUMBNAIL_PUBLIC_BASE_URL が未設定の場合は掲載サイトの画像URLを直接LINEに表示させる
+LINE_RICH_MESSAGES = _env_flag("LINE_RICH_MESSAGES", False)
 
 # ログ設定
 LOG_DIR = BASE_DIR / "logs"
@@ -33,10 +133,22 @@ LOG_FILE = LOG_DIR / "watcher.log"
 # トークンとユーザーIDは環境変数から取得（セキュリティのため）
 LINE_CHANNEL_ACCESS_TOKEN = os.environ.get("LINE_CHANNEL_ACCESS_TOKEN", "")
 LINE_USER_ID = os.environ.get("LINE_USER_ID", "")
+# 通知先ファイルがない場合に LINE_USER_ID の1人だけへ送るか（未設定なら従来どおり友だち全員にブロードキャスト）
+LINE_NOTIFY_USER_ID_ONLY = _env_flag("LINE_NOTIFY_USER_ID_ONLY", False)
 
 # LINE Messaging API URL（ブロードキャスト用 - 友だち全員に送信）
-LINE_MESSAGING_API = "https://api.line.me/v2/bot/message/broadcast"
+LINE_API_BASE_URL = os.environ.get("LINE_API_BASE_URL", "https://api.line.me")
+LINE_MESSAGING_API = f"{LINE_API_BASE_URL}/v2/bot/message/broadcast"
+
+# LINE Messaging API URL（マルチキャスト用 - 指定したユーザーにのみ送信）
+LINE_MULTICAST_API = f"{LINE_API_BASE_URL}/v2/bot/message/multicast"
+# マルチキャスト1回あたりの送信先の上限
+LINE_MULTICAST_MAX_RECIPIENTS = 500
+# カルーセル1つに入れられる物件数の上限
+LINE_CAROUSEL_MAX_BUBBLES = 10
+# 通知先ごとの希望条件（recipients.py を参照）
+RECIPIENTS_FILE = Path(os.environ.get("LINE_RECIPIENTS_FILE", DATA_DIR / "recipients.json"))
 
 # ディレクトリが存在しない場合は作成
-DATA_DIR.mkdir(exist_ok=True)
+DATA_DIR.mkdir(parents=True, exist_ok=True)
 LOG_DIR.mkdir(exist_ok=True)
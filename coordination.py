@@ -0,0 +1,268 @@
+"""複数ホストで監視を動かすための協調モジュール
+
+launchd（Mac）と GitHub Actions のように複数のホストで冗長に動かすと、同じ物件を二重に通知してしまう。
+共有ストア（SQLite）上で次の4つを管理する。
+- ワーカーの生存リース: 実行のたびに更新し、期限切れのワーカーは停止したものとみなす
+- サイトの割り当て: 生存中のワーカーでサイトを分担し、サイトごとのリースで同時処理を防ぐ
+- 通知の重複排除: (サイト, 物件ID, イベント) のキーを先に確保したワーカーだけが通知する
+  （キーワード通知のイベントには掲載内容のハッシュを含める。掲載終了した物件のキーと
+  保持期間を過ぎたキーは削除し、再掲載時には再び通知する）
+- サイトごとの物件スナップショット: 新着判定・サイト横断の重複検出・掲載履歴の比較対象を
+  ワーカー間で共有し、担当外のサイトや引き継いだサイトでも最新の掲載状況と比較する
+ワーカーのリースが切れると、次に実行したワーカーが担当サイトを自動的に引き継ぐ。
+
+環境変数 WATCHER_COORDINATION_DB が未設定の場合は協調せず、従来どおりすべてのサイトを処理する。
+
+共有ストアはSQLiteファイルのみ対応しているため、協調できるのは同じファイルを読み書きできるホスト
+（同一マシン上の複数プロセスや、共有ディスクをマウントしたホスト）に限られる。
+launchd（Mac）と GitHub Actions のようにファイルを共有できない組み合わせでは協調できないので、
+どちらか一方だけで監視を動かすこと。
+"""
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from config import (
+    COORDINATION_DB,
+    NOTIFICATION_KEY_TTL_SECONDS,
+    WATCHER_ID,
+    WORKER_LEASE_SECONDS,
+)
+from scraper import Property
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notifications (
+    dedup_key TEXT PRIMARY KEY,
+    worker_id TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notifications_created_at ON notifications (created_at);
+CREATE TABLE IF NOT EXISTS snapshots (
+    site TEXT PRIMARY KEY,
+    properties TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def dedup_key(site: str, property_id: str, event: str) -> str:
+    return f"{site}:{property_id}:{event}"
+
+
+def keyword_event(profile_name: str, doc_hash: str) -> str:
+    """キーワード通知のイベント名（掲載内容のハッシュを含め、内容が変わるたびに通知できるようにする）"""
+    return f"keyword:{profile_name}:{doc_hash}"
+
+
+Event = Union[str, Callable[[Property], str]]
+
+
+def _dedup_key(site: str, prop: Property, event: Event) -> str:
+    return dedup_key(site, prop.id, event if isinstance(event, str) else event(prop))
+
+
+class Coordinator:
+    """SQLiteを共有ストアにしたワーカー間の協調"""
+
+    def __init__(self, path: str, worker_id: str, lease_seconds: float = WORKER_LEASE_SECONDS):
+        self.path = path
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @classmethod
+    def from_config(cls) -> Optional["Coordinator"]:
+        if not COORDINATION_DB:
+            return None
+        return cls(COORDINATION_DB, WATCHER_ID)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """書き込みロックを取ってから読み書きする（他ワーカーとの競合を防ぐ）"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self) -> None:
+        """生存リースを更新"""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO workers (worker_id, expires_at) VALUES (?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET expires_at = excluded.expires_at",
+                (self.worker_id, time.time() + self.lease_seconds),
+            )
+
+    def live_workers(self) -> list[str]:
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT worker_id FROM workers WHERE expires_at > ? ORDER BY worker_id",
+                (time.time(),),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def assigned_sites(self, sites: Iterable[str]) -> list[str]:
+        """生存中のワーカーでサイトを分担し、自分の担当分を返す"""
+        workers = self.live_workers()
+        if self.worker_id not in workers:
+            workers = sorted(workers + [self.worker_id])
+        index = workers.index(self.worker_id)
+        return [site for i, site in enumerate(sorted(sites)) if i % len(workers) == index]
+
+    def acquire_lease(self, name: str) -> bool:
+        """リースを取得・更新（他のワーカーが有効なリースを持っている場合はFalse）"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT holder, expires_at FROM leases WHERE name = ?", (name,)
+            ).fetchone()
+            if row and row[0] != self.worker_id and row[1] > now:
+                return False
+            conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at",
+                (name, self.worker_id, now + self.lease_seconds),
+            )
+        if row and row[0] != self.worker_id:
+            logger.info(f"リースを引き継ぎました: {name}（前の保持者: {row[0]}）")
+        return True
+
+    def release_lease(self, name: str) -> None:
+        """自分が保持しているリースを解放"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, self.worker_id))
+
+    def sites_to_watch(self, sites: Iterable[str]) -> list[str]:
+        """生存リースを更新し、担当かつリースを取得できたサイトを返す"""
+        self.heartbeat()
+        sites = list(sites)
+        assigned = self.assigned_sites(sites)
+        # 担当から外れたサイトはリースを手放し、新しい担当ワーカーがすぐに引き継げるようにする
+        for site in sites:
+            if site not in assigned:
+                self.release_lease(f"site:{site}")
+        acquired = [site for site in assigned if self.acquire_lease(f"site:{site}")]
+        logger.info(f"ワーカー {self.worker_id} の担当サイト: {', '.join(acquired) or 'なし'}")
+        return acquired
+
+    def claim(self, keys: Iterable[str]) -> set[str]:
+        """通知キーを確保し、自分が初めて確保できたキーを返す（保持期間を過ぎたキーは先に削除）"""
+        claimed = set()
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM notifications WHERE created_at < ?", (now - NOTIFICATION_KEY_TTL_SECONDS,)
+            )
+            for key in keys:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO notifications (dedup_key, worker_id, created_at) VALUES (?, ?, ?)",
+                    (key, self.worker_id, now),
+                )
+                if cursor.rowcount:
+                    claimed.add(key)
+        return claimed
+
+    def release(self, keys: Iterable[str]) -> None:
+        """送信に失敗した通知キーを解放し、次回の再送を可能にする"""
+        with self._transaction() as conn:
+            conn.executemany(
+                "DELETE FROM notifications WHERE dedup_key = ? AND worker_id = ?",
+                [(key, self.worker_id) for key in keys],
+            )
+
+    def forget(self, prefixes: Iterable[str]) -> None:
+        """指定した接頭辞の通知キーを、確保したワーカーに関わらず削除"""
+        with self._transaction() as conn:
+            # 物件IDに "_" を含むことがあるため、LIKEではなく先頭の部分文字列で比較する
+            conn.executemany(
+                "DELETE FROM notifications WHERE substr(dedup_key, 1, ?) = ?",
+                [(len(prefix), prefix) for prefix in prefixes],
+            )
+
+    def save_snapshot(self, site: str, properties: list[Property]) -> None:
+        """サイトの物件スナップショットを共有ストアに保存"""
+        data = json.dumps([p.to_dict() for p in properties], ensure_ascii=False)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO snapshots (site, properties, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(site) DO UPDATE SET properties = excluded.properties, "
+                "updated_at = excluded.updated_at",
+                (site, data, time.time()),
+            )
+
+    def load_snapshot(self, site: str) -> Optional[dict[str, Property]]:
+        """共有ストアのスナップショットを読み込む（まだ保存されていなければNone）"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT properties FROM snapshots WHERE site = ?", (site,)).fetchone()
+        if row is None:
+            return None
+        return {p["id"]: Property.from_dict(p) for p in json.loads(row[0])}
+
+
+def claim_properties(
+    coordinator: Optional[Coordinator], site: str, properties: list[Property], event: Event
+) -> list[Property]:
+    """他のワーカーが通知済みの物件を除き、自分が通知する物件を返す（eventは物件ごとに決めてもよい）"""
+    if coordinator is None or not properties:
+        return properties
+
+    claimed = coordinator.claim(_dedup_key(site, p, event) for p in properties)
+    skipped = len(properties) - len(claimed)
+    if skipped:
+        logger.info(f"他のワーカーが通知済みのためスキップ: {skipped}件")
+    return [p for p in properties if _dedup_key(site, p, event) in claimed]
+
+
+def release_properties(
+    coordinator: Optional[Coordinator], site: str, properties: list[Property], event: Event
+) -> None:
+    """通知に失敗した物件の通知キーを解放"""
+    if coordinator is not None and properties:
+        coordinator.release(_dedup_key(site, p, event) for p in properties)
+
+
+def forget_properties(coordinator: Optional[Coordinator], site: str, properties: list[Property]) -> None:
+    """掲載終了した物件の通知キー（新着・キーワード）をすべて削除し、再掲載時に再び通知できるようにする"""
+    if coordinator is not None and properties:
+        coordinator.forget(dedup_key(site, p.id, "") for p in properties)
+
+
+def load_shared_snapshot(
+    coordinator: Optional[Coordinator], site: str, load_local: Callable[[], dict[str, Property]]
+) -> dict[str, Property]:
+    """協調時は共有ストアのスナップショットを、それ以外はローカルの保存済み物件を返す"""
+    if coordinator is not None:
+        shared = coordinator.load_snapshot(site)
+        if shared is not None:
+            return shared
+    return load_local()
+
+
+def save_shared_snapshot(coordinator: Optional[Coordinator], site: str, properties: list[Property]) -> None:
+    """協調時は物件スナップショットを共有ストアにも保存"""
+    if coordinator is not None:
+        coordinator.save_snapshot(site, properties)
@@ -0,0 +1,197 @@
+"""サイト横断の重複物件検出モジュール
+
+東京R不動産とリノベ百貨店に同じ住戸が別IDで掲載されることがあるため、
+駅名・面積・賃料を正規化して突き合わせる。
+(駅名, 丸めた面積) をキーにしたブロッキングインデックスで候補を絞り込み、
+候補ペアのみタイトル・所在地の類似度で採点するので、全履歴に対しても毎回実行できる。
+同じ建物の別住戸は駅・面積・賃料が近いことが多いため、賃料が一致するだけでは重複とみなさず、
+両サイトにある情報で裏付けを求める: 面積が小数点以下まで一致する（またはタイトル・所在地が似ている）こと、
+駅徒歩分数と管理費が両方分かる場合はそれが食い違わないこと。
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Iterable, Optional
+
+from config import (
+    CROSS_SITE_AREA_TOLERANCE,
+    CROSS_SITE_EXACT_AREA_TOLERANCE,
+    CROSS_SITE_MATCH_THRESHOLD,
+    CROSS_SITE_MIN_TEXT_SIMILARITY,
+    CROSS_SITE_RENT_TOLERANCE,
+    CROSS_SITE_WALK_TOLERANCE,
+)
+from normalize import (
+    normalize_location,
+    normalize_station,
+    normalize_text,
+    parse_area_sqm,
+    parse_fee_yen,
+    parse_rent_yen,
+)
+from scraper import Property
+from stations import parse_station_info
+
+logger = logging.getLogger(__name__)
+
+BlockKey = tuple[str, int]
+
+
+@dataclass
+class _Normalized:
+    """突き合わせ用に正規化した物件"""
+    prop: Property
+    station: str
+    area: Optional[float]
+    rent: Optional[int]
+    fee: Optional[int]
+    walk_minutes: Optional[int]
+    title: str
+    location: str
+
+    @classmethod
+    def from_property(cls, prop: Property) -> "_Normalized":
+        return cls(
+            prop=prop,
+            station=normalize_station(prop.station),
+            area=parse_area_sqm(prop.area),
+            rent=parse_rent_yen(prop.rent),
+            fee=parse_fee_yen(prop.rent),
+            walk_minutes=parse_station_info(prop.station).walk_minutes,
+            title=normalize_text(prop.title),
+            location=normalize_location(prop.location),
+        )
+
+
+@dataclass
+class DuplicateMatch:
+    """重複と判定された物件のペア"""
+    new: Property
+    existing: Property
+    score: float
+    text_similarity: float
+
+
+def _block_key(station: str, area: Optional[float]) -> Optional[BlockKey]:
+    if not station or area is None:
+        return None
+    return (station, round(area))
+
+
+def _similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _rent_score(a: Optional[int], b: Optional[int]) -> float:
+    """賃料の近さを0〜1で返す（許容差を超えたら0）"""
+    if a is None or b is None:
+        return 0.0
+    diff = abs(a - b) / max(a, b)
+    if diff > CROSS_SITE_RENT_TOLERANCE:
+        return 0.0
+    return 1.0 - diff / CROSS_SITE_RENT_TOLERANCE if CROSS_SITE_RENT_TOLERANCE else 1.0
+
+
+def _contradicts(a: _Normalized, b: _Normalized) -> bool:
+    """両サイトで分かる面積・駅徒歩分数・管理費が食い違うか（食い違えば別住戸・別物件とみなす）"""
+    if a.area is None or b.area is None or abs(a.area - b.area) > CROSS_SITE_AREA_TOLERANCE:
+        return True
+    if (
+        a.walk_minutes is not None and b.walk_minutes is not None
+        and abs(a.walk_minutes - b.walk_minutes) > CROSS_SITE_WALK_TOLERANCE
+    ):
+        return True
+    return a.fee is not None and b.fee is not None and a.fee != b.fee
+
+
+def _pair_scores(a: _Normalized, b: _Normalized) -> tuple[float, bool, float]:
+    """候補ペアの (賃料の近さ, 面積が一致するか, タイトル・所在地の類似度) を返す"""
+    rent = _rent_score(a.rent, b.rent)
+    exact_area = abs(a.area - b.area) <= CROSS_SITE_EXACT_AREA_TOLERANCE
+    text = max(_similarity(a.title, b.title), _similarity(a.location, b.location))
+    return rent, exact_area, text
+
+
+class BlockingIndex:
+    """(駅名, 丸めた面積) をキーにした物件インデックス"""
+
+    def __init__(self, properties: Iterable[Property] = ()):
+        self._blocks: dict[BlockKey, list[_Normalized]] = defaultdict(list)
+        for prop in properties:
+            self.add(prop)
+
+    def add(self, prop: Property) -> None:
+        normalized = _Normalized.from_property(prop)
+        key = _block_key(normalized.station, normalized.area)
+        if key:
+            self._blocks[key].append(normalized)
+
+    def candidates(self, normalized: _Normalized) -> Iterable[_Normalized]:
+        """丸め境界をまたぐ場合に備え、隣接する面積のブロックも候補に含める"""
+        key = _block_key(normalized.station, normalized.area)
+        if not key:
+            return
+        station, area = key
+        for offset in (-1, 0, 1):
+            yield from self._blocks.get((station, area + offset), ())
+
+    def best_match(self, prop: Property) -> Optional[DuplicateMatch]:
+        """閾値以上で最も一致度の高い物件を返す"""
+        normalized = _Normalized.from_property(prop)
+        best: Optional[DuplicateMatch] = None
+        for candidate in self.candidates(normalized):
+            if _contradicts(normalized, candidate):
+                continue
+            rent, exact_area, text = _pair_scores(normalized, candidate)
+            if not rent:
+                continue
+            if not exact_area and text < CROSS_SITE_MIN_TEXT_SIMILARITY:
+                # 駅・賃料が近いだけで面積が一致しないペアは同じ建物の別住戸の可能性があるため重複とみなさない
+                logger.info(
+                    f"  面積が一致しないため重複とみなしません: {prop.title} ({normalized.area}㎡) / "
+                    f"{candidate.prop.title} ({candidate.area}㎡) rent={rent:.2f} text={text:.2f}"
+                )
+                continue
+            # タイトル・所在地はサイトごとに書き方が異なるため、一致の裏付け（面積か文字列）の強い方で採点する
+            score = 0.5 * rent + 0.5 * max(1.0 if exact_area else 0.0, text)
+            if score >= CROSS_SITE_MATCH_THRESHOLD and (best is None or score > best.score):
+                best = DuplicateMatch(new=prop, existing=candidate.prop, score=score, text_similarity=text)
+        return best
+
+
+def find_cross_site_duplicates(
+    new_properties: list[Property],
+    other_site_properties: Iterable[Property],
+) -> list[DuplicateMatch]:
+    """新着物件のうち、他サイトで既に掲載済みの物件と重複するものを返す"""
+    index = BlockingIndex(other_site_properties)
+    matches = []
+    for prop in new_properties:
+        match = index.best_match(prop)
+        if match:
+            matches.append(match)
+    return matches
+
+
+def suppress_cross_site_duplicates(
+    new_properties: list[Property],
+    other_site_properties: Iterable[Property],
+    other_site_name: str,
+) -> list[Property]:
+    """他サイトで通知済みの物件を新着から除外する"""
+    matches = find_cross_site_duplicates(new_properties, other_site_properties)
+    if not matches:
+        return new_properties
+
+    duplicate_ids = set()
+    for match in matches:
+        duplicate_ids.add(match.new.id)
+        logger.info(
+            f"  重複のため通知を抑制: {match.new.title} ≒ "
+            f"{other_site_name} {match.existing.title} ({match.existing.url}) "
+            f"score={match.score:.2f} text={match.text_similarity:.2f}"
+        )
+    return [p for p in new_properties if p.id not in duplicate_ids]
@@ -0,0 +1,281 @@
+"""掲載履歴の記録と掲載期間分析モジュール
+
+save_properties は毎回最新の一覧で上書きするため、掲載開始・終了や賃料改定の履歴を
+追記専用のイベントログ（data/history.jsonl）に別途記録する。
+集計・書き出しはログを1行ずつ読むので、履歴が増えてもメモリに全件を載せない。
+リノベ百貨店の一覧には所在地がないため、区別の集計ではサイトごとの「区不明」にまとめる。
+"""
+import csv
+import gzip
+import json
+import logging
+import statistics
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+from config import HISTORY_FILE, HISTORY_RENT_BAND_YEN
+from normalize import extract_ward, parse_area_sqm, parse_rent_yen
+from scraper import Property
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = ["ts", "site", "id", "event", "rent", "rent_yen", "area_sqm", "ward", "seeded"]
+EXPORT_BATCH_SIZE = 10000
+
+
+def _event(ts: str, site: str, event: str, prop: Property, seeded: bool = False) -> dict:
+    return {
+        "ts": ts,
+        "site": site,
+        "id": prop.id,
+        "event": event,
+        "rent": prop.rent,
+        "rent_yen": parse_rent_yen(prop.rent),
+        "area_sqm": parse_area_sqm(prop.area),
+        "ward": extract_ward(prop.location),
+        "seeded": seeded,
+    }
+
+
+def _open_listings(site: str) -> Optional[dict[str, dict]]:
+    """履歴上で掲載中の物件ごとの最新イベント（そのサイトの履歴がなければNone）"""
+    listings: Optional[dict[str, dict]] = None
+    for event in iter_events(HISTORY_FILE):
+        if event["site"] != site:
+            continue
+        if listings is None:
+            listings = {}
+        if event["event"] == "disappeared":
+            listings.pop(event["id"], None)
+        else:
+            listings[event["id"]] = event
+    return listings
+
+
+def record_history(site: str, current: list[Property], saved: dict[str, Property]) -> int:
+    """前回の一覧との差分から掲載開始・終了・賃料改定のイベントを記録
+
+    保存済みの一覧が失われても、履歴上で掲載中の物件は掲載開始を記録し直さない
+    （掲載開始日時がリセットされ、掲載期間が短く集計されるのを防ぐ）。
+    """
+    ts = datetime.now().isoformat(timespec="seconds")
+    open_listings = _open_listings(site)
+    # 履歴の記録開始時点で掲載中の物件は掲載開始日時が不明なため、seededとして区別する
+    seeding = open_listings is None
+    open_listings = open_listings or {}
+
+    events = []
+    current_ids = set()
+    for prop in current:
+        current_ids.add(prop.id)
+        previous = saved.get(prop.id)
+        if previous is None and prop.id in open_listings:
+            # 保存済みの一覧にはないが履歴上は掲載中（一覧の消失など）なので、賃料の変化だけを記録する
+            if open_listings[prop.id]["rent_yen"] != parse_rent_yen(prop.rent):
+                events.append(_event(ts, site, "rent_changed", prop))
+        elif previous is None:
+            # 保存済みの一覧もない場合（新しいデータディレクトリなど）は掲載開始日時が分からない
+            events.append(_event(ts, site, "appeared", prop, seeded=seeding and not saved))
+        elif seeding:
+            events.append(_event(ts, site, "appeared", prop, seeded=True))
+        elif parse_rent_yen(previous.rent) != parse_rent_yen(prop.rent):
+            events.append(_event(ts, site, "rent_changed", prop))
+
+    for prop_id, prop in saved.items():
+        if prop_id not in current_ids:
+            events.append(_event(ts, site, "disappeared", prop))
+    for prop_id, event in open_listings.items():
+        # 保存済みの一覧が失われている間に掲載終了した物件は、履歴上の最新の内容で終了を記録する
+        if prop_id not in current_ids and prop_id not in saved:
+            events.append({**event, "ts": ts, "event": "disappeared", "seeded": False})
+
+    try:
+        with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        if events:
+            logger.info(f"掲載履歴を記録しました: {site} {len(events)}件")
+    except Exception as e:
+        logger.error(f"掲載履歴の記録に失敗: {e}")
+    return len(events)
+
+
+def iter_events(path: Path = HISTORY_FILE) -> Iterator[dict]:
+    """イベントログを1件ずつ読み出す"""
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def rent_band(rent_yen: Optional[int]) -> str:
+    """賃料帯のラベル（例: "15-20万円"）"""
+    if rent_yen is None:
+        return "不明"
+    step = HISTORY_RENT_BAND_YEN // 10000
+    lower = rent_yen // HISTORY_RENT_BAND_YEN * step
+    return f"{lower}-{lower + step}万円"
+
+
+@dataclass
+class _Listing:
+    """掲載中の物件の集計用状態"""
+    site: str
+    appeared_at: Optional[datetime]
+    initial_rent: Optional[int]
+    last_rent: Optional[int]
+    ward: str
+    drops: int = 0
+
+
+@dataclass
+class GroupStats:
+    """区・賃料帯ごとの集計結果"""
+    days_on_market: list[float] = field(default_factory=list)
+    closed: int = 0
+    price_drop_listings: int = 0
+    price_drop_ratios: list[float] = field(default_factory=list)
+    active: int = 0
+
+    def summary(self) -> dict:
+        days = self.days_on_market
+        return {
+            "closed": self.closed,
+            "active": self.active,
+            "median_days": round(statistics.median(days), 1) if days else None,
+            "mean_days": round(statistics.mean(days), 1) if days else None,
+            "price_drop_listings": self.price_drop_listings,
+            "mean_drop_pct": (
+                round(statistics.mean(self.price_drop_ratios) * 100, 1)
+                if self.price_drop_ratios else None
+            ),
+        }
+
+
+def compute_stats(path: Path = HISTORY_FILE) -> dict[tuple[str, str], GroupStats]:
+    """区・賃料帯ごとの掲載期間と値下げの統計を計算"""
+    open_listings: dict[tuple[str, str], _Listing] = {}
+    groups: dict[tuple[str, str], GroupStats] = defaultdict(GroupStats)
+
+    def close(listing: _Listing, ended_at: Optional[datetime]) -> GroupStats:
+        # 所在地から区が分からない物件（リノベ百貨店など）は区別の集計に混ぜず、サイトごとにまとめる
+        ward = listing.ward or f"区不明（{listing.site}）"
+        stats = groups[(ward, rent_band(listing.initial_rent))]
+        if ended_at:
+            stats.closed += 1
+        # 記録開始前から掲載中だった物件は掲載期間が不明なため日数に含めない
+        if listing.appeared_at and ended_at:
+            stats.days_on_market.append((ended_at - listing.appeared_at).total_seconds() / 86400)
+        if listing.drops:
+            stats.price_drop_listings += 1
+            if listing.initial_rent and listing.last_rent:
+                stats.price_drop_ratios.append(1 - listing.last_rent / listing.initial_rent)
+        return stats
+
+    for event in iter_events(path):
+        key = (event["site"], event["id"])
+        ts = datetime.fromisoformat(event["ts"])
+        if event["event"] == "appeared":
+            open_listings[key] = _Listing(
+                site=event["site"],
+                appeared_at=None if event.get("seeded") else ts,
+                initial_rent=event["rent_yen"],
+                last_rent=event["rent_yen"],
+                ward=event["ward"],
+            )
+        elif event["event"] == "rent_changed" and key in open_listings:
+            listing = open_listings[key]
+            if listing.last_rent and event["rent_yen"] and event["rent_yen"] < listing.last_rent:
+                listing.drops += 1
+            listing.last_rent = event["rent_yen"]
+        elif event["event"] == "disappeared" and key in open_listings:
+            close(open_listings.pop(key), ts)
+
+    for listing in open_listings.values():
+        close(listing, None).active += 1
+    return dict(groups)
+
+
+def _export_csv_gz(output: Path, path: Path) -> int:
+    count = 0
+    with gzip.open(output, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for event in iter_events(path):
+            writer.writerow(event)
+            count += 1
+    return count
+
+
+def _export_parquet(output: Path, path: Path) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("ts", pa.string()),
+        ("site", pa.string()),
+        ("id", pa.string()),
+        ("event", pa.string()),
+        ("rent", pa.string()),
+        ("rent_yen", pa.int64()),
+        ("area_sqm", pa.float64()),
+        ("ward", pa.string()),
+        ("seeded", pa.bool_()),
+    ])
+    count = 0
+    batch: list[dict] = []
+    with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+        for event in iter_events(path):
+            batch.append(event)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def export_history(output: Path, path: Path = HISTORY_FILE) -> int:
+    """イベントログを書き出す（拡張子 .parquet ならParquet、それ以外はCSV.gz）"""
+    if output.suffix == ".parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            output = output.with_suffix(".csv.gz")
+            logger.warning(f"pyarrowがインストールされていないためCSV.gzで書き出します: {output}")
+        else:
+            count = _export_parquet(output, path)
+            logger.info(f"掲載履歴を書き出しました: {output} ({count}件)")
+            return count
+
+    count = _export_csv_gz(output, path)
+    logger.info(f"掲載履歴を書き出しました: {output} ({count}件)")
+    return count
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python history.py stats
+    #   python history.py export data/history.csv.gz
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+
+    if command == "export":
+        export_history(Path(sys.argv[2] if len(sys.argv) > 2 else "history.csv.gz"))
+    else:
+        for (ward, band), stats in sorted(compute_stats().items()):
+            summary = stats.summary()
+            print(
+                f"{ward} {band}: 掲載終了{summary['closed']}件 掲載中{summary['active']}件 "
+                f"掲載日数 中央値{summary['median_days']} 平均{summary['mean_days']} "
+                f"値下げ{summary['price_drop_listings']}件 平均値下げ率{summary['mean_drop_pct']}%"
+            )
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""ローカル負荷試験ハーネス
+
+東京R不動産の estate_search.php・リノベ百貨店の sch_list.php を模した合成ページと、
+レート制限・エラー率を設定できるLINEブロードキャストの偽エンドポイントをローカルで起動し、
+環境変数で接続先を差し替えた main.main を繰り返し実行して、
+1サイクルの処理時間・スループット・掲載から通知までの時間を計測する。
+
+使い方:
+    python load_harness.py --listings 200 --cycles 5 --latency 0.5 --line-rate 2 --line-error-rate 0.1
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs
+
+# 合成データに使う値（駅は data/stations.csv に含まれるもの）
+SYNTHETIC_STATIONS = [
+    ("山手線", "渋谷"), ("中央線", "中野"), ("京王線", "笹塚"), ("東急東横線", "学芸大学"),
+    ("小田急線", "下北沢"), ("丸ノ内線", "新高円寺"), ("東急田園都市線", "三軒茶屋"),
+    ("千代田線", "乃木坂"), ("日比谷線", "人形町"), ("中央線", "吉祥寺"),
+]
+SYNTHETIC_WARDS = ["港区赤坂", "渋谷区本町", "中野区東中野", "杉並区高円寺南", "世田谷区北沢", "目黒区目黒本町"]
+SYNTHETIC_MADORI = ["203", "205", "302", "303"]
+SYNTHETIC_WORDS = ["光の入る", "静かな", "レトロな", "天井高のある", "ペット可の", "ルーフバルコニー付きの"]
+
+# 通知メッセージ中の物件URLから物件IDを取り出す
+_NOTIFIED_ID_PATTERN = re.compile(r'estate\.php\?n=(\d+)|/detail/\d+/([\w\d_]+)/')
+
+
+@dataclass
+class SyntheticListing:
+    """合成物件"""
+    id: str
+    title: str
+    location: str
+    rent_yen: int
+    area: float
+    line: str
+    station: str
+    walk: int
+    description: str
+    madori: str
+
+
+class SyntheticSite:
+    """サイクルごとに一部の物件が入れ替わる合成物件一覧"""
+
+    def __init__(self, prefix: str, size: int, turnover: float, seed: int):
+        self.prefix = prefix
+        self.size = size
+        self.turnover = turnover
+        self.random = random.Random(seed)
+        self.next_id = 100000
+        self.lock = threading.Lock()
+        self.first_served: dict[str, float] = {}
+        self.listings: list[SyntheticListing] = [self._generate() for _ in range(size)]
+
+    def _generate(self) -> SyntheticListing:
+        self.next_id += 1
+        line, station = self.random.choice(SYNTHETIC_STATIONS)
+        word = self.random.choice(SYNTHETIC_WORDS)
+        return SyntheticListing(
+            id=f"{self.prefix}{self.next_id}",
+            title=f"{word}部屋{self.next_id}",
+            location=self.random.choice(SYNTHETIC_WARDS),
+            rent_yen=self.random.randrange(150, 300) * 1000,
+            area=round(self.random.uniform(40, 90), 2),
+            line=line,
+            station=station,
+            walk=self.random.randint(1, 15),
+            description=f"{word}住まい。駅から歩いて通える、日当たりのよい角部屋です。",
+            madori=self.random.choice(SYNTHETIC_MADORI),
+        )
+
+    def advance(self) -> None:
+        """古い物件を取り下げ、同数の新着物件を追加"""
+        with self.lock:
+            replaced = int(self.size * self.turnover)
+            self.listings = self.listings[replaced:] + [self._generate() for _ in range(replaced)]
+
+    def serve(self, form: Optional[dict[str, list[str]]] = None, cap: int = 0) -> list[SyntheticListing]:
+        """検索条件に一致する一覧を上限件数まで返し、初めて配信した時刻を記録"""
+        now = time.monotonic()
+        with self.lock:
+            listings = self.listings
+            if form:
+                madori = set(form.get("madori[]", SYNTHETIC_MADORI))
+                prices = [int(p) * 10000 for p in form.get("price[]", [])]
+                listings = [
+                    listing for listing in listings
+                    if listing.madori in madori
+                    and (not prices or min(prices) <= listing.rent_yen <= max(prices))
+                ]
+            if cap:
+                listings = listings[:cap]
+            for listing in listings:
+                self.first_served.setdefault(listing.id, now)
+            return list(listings)
+
+
+def _synthetic_jpeg() -> bytes:
+    """サムネイル取得用の小さなJPEG画像（Pillowがない場合はJPEGの先頭・末尾マーカーのみ）"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return b"\xff\xd8\xff\xe0synthetic-image\xff\xd9"
+    output = io.BytesIO()
+    Image.new("RGB", (640, 480), (200, 180, 160)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+SYNTHETIC_JPEG = _synthetic_jpeg()
+
+
+def render_tokyo_r(listings: list[SyntheticListing]) -> str:
+    """東京R不動産の検索結果ページを模したHTML"""
+    items = []
+    for listing in listings:
+        man, rest = divmod(listing.rent_yen, 10000)
+        rent = f"{man}万{rest:,}円" if rest else f"{man}万円"
+        items.append(
+            f'<a href="/estate.php?n={listing.id}">'
+            f'<img src="/img/{listing.id}.jpg">'
+            f"<table><tr><td>{listing.location}</td></tr></table>"
+            f"<p>{listing.description}</p>"
+            f" rent {listing.title} {rent} {listing.area}㎡ "
+            f"{listing.line}「{listing.station}」駅 徒歩{listing.walk}分</a>"
+        )
+    return "<html><body>" + "\n".join(items) + "</body></html>"
+
+
+def render_renov(listings: list[SyntheticListing]) -> str:
+    """リノベ百貨店の検索結果ページを模したHTML"""
+    items = []
+    for listing in listings:
+        items.append(
+            f'<div class="property-item"><a href="/detail/001/{listing.id}/">詳細</a>'
+            f'<img data-src="/img/{listing.id}.jpg">'
+            f'<span class="title fnt-bold">{listing.title}</span>'
+            f'<span class="place">{listing.station}駅徒歩{listing.walk}分</span>'
+            f'<span class="price">{listing.rent_yen:,}円/5,000円 {listing.area}㎡</span></div>'
+        )
+    return "<html><body>" + "\n".join(items) + "</body></html>"
+
+
+class TokenBucket:
+    """LINE APIのレート制限を模したトークンバケット"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+@dataclass
+class FakeLine:
+    """LINE Messaging APIの偽エンドポイントの状態"""
+    bucket: TokenBucket
+    error_rate: float
+    rng: random.Random = field(default_factory=lambda: random.Random(0))
+    status_counts: dict[int, int] = field(default_factory=dict)
+    notified_at: dict[str, float] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def handle(self, body: bytes) -> int:
+        if not self.bucket.take():
+            status = 429
+        elif self.rng.random() < self.error_rate:
+            status = 500
+        else:
+            status = 200
+
+        with self.lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if status == 200:
+                # テキスト・Flexどちらのメッセージでも物件URLから物件IDを拾う
+                now = time.monotonic()
+                for match in _NOTIFIED_ID_PATTERN.finditer(body.decode("utf-8")):
+                    self.notified_at.setdefault(match.group(1) or match.group(2), now)
+        return status
+
+
+class StandInServer(ThreadingHTTPServer):
+    """合成サイトとLINE偽エンドポイントをまとめて配信するサーバー"""
+    daemon_threads = True
+
+    def __init__(
+        self, address, tokyo_r: SyntheticSite, renov: SyntheticSite, line: FakeLine,
+        latency: float, renov_cap: int,
+    ):
+        super().__init__(address, StandInHandler)
+        self.tokyo_r = tokyo_r
+        self.renov = renov
+        self.line = line
+        self.latency = latency
+        self.renov_cap = renov_cap
+        # リクエストはスレッドごとに処理されるため、カウンタの更新はロックで守る
+        self.lock = threading.Lock()
+        self.renov_requests = 0
+        self.image_requests: dict[str, int] = {}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status: int, body: str | bytes, content_type: str = "text/html; charset=utf-8") -> None:
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        if self.path.startswith("/estate_search.php"):
+            time.sleep(self.server.latency)
+            self._respond(200, render_tokyo_r(self.server.tokyo_r.serve()))
+        elif self.path.startswith("/img/"):
+            with self.server.lock:
+                counts = self.server.image_requests
+                counts[self.path] = counts.get(self.path, 0) + 1
+            self._respond(200, SYNTHETIC_JPEG, "image/jpeg")
+        else:
+            self._respond(404, "not found")
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.startswith("/sch/sch_list.php"):
+            time.sleep(self.server.latency)
+            with self.server.lock:
+                self.server.renov_requests += 1
+            form = parse_qs(body.decode("utf-8"), keep_blank_values=True)
+            self._respond(200, render_renov(self.server.renov.serve(form, self.server.renov_cap)))
+        elif self.path.startswith("/v2/bot/message/"):
+            status = self.server.line.handle(body)
+            self._respond(status, json.dumps({"message": str(status)}), "application/json")
+        else:
+            self._respond(404, "not found")
+
+
+def _percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 3)
+
+
+def run_harness(args) -> dict:
+    """ローカルサーバーを起動して main.main を繰り返し実行し、計測結果を返す"""
+    tokyo_r = SyntheticSite("", args.listings, args.turnover, seed=1)
+    renov = SyntheticSite("rv", args.listings, args.turnover, seed=2)
+    line = FakeLine(TokenBucket(args.line_rate, args.line_burst), args.line_error_rate)
+    server = StandInServer(("127.0.0.1", 0), tokyo_r, renov, line, args.latency, args.renov_cap)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="watcher-harness-")
+    if args.recipients:
+        # 希望条件の異なる通知先を生成し、マルチキャスト配信を経由させる
+        rng = random.Random(3)
+        recipients = [
+            {"user_id": f"U{i:032x}", "max_rent": rng.choice([200000, 250000, 300000])}
+            for i in range(args.recipients)
+        ]
+        with open(os.path.join(data_dir, "recipients.json"), "w", encoding="utf-8") as f:
+            json.dump(recipients, f)
+    os.environ.update({
+        "TOKYO_R_SEARCH_URL": f"{base_url}/estate_search.php",
+        "TOKYO_R_BASE_URL": base_url,
+        "RENOV_SEARCH_URL": f"{base_url}/sch/sch_list.php",
+        "RENOV_BASE_URL": base_url,
+        "LINE_API_BASE_URL": base_url,
+        "LINE_CHANNEL_ACCESS_TOKEN": "harness",
+        "THUMBNAIL_PUBLIC_BASE_URL": base_url,
+        "LINE_RICH_MESSAGES": "true",
+        "WATCHER_DATA_DIR": data_dir,
+        "RENOV_RESULT_CAP": str(args.renov_cap),
+    })
+    # 接続先を差し替えた環境変数で設定を読み込ませるため、ここで初めてimportする
+    import main as watcher
+
+    cycle_seconds = []
+    for cycle in range(args.cycles):
+        if cycle:
+            tokyo_r.advance()
+            renov.advance()
+        started = time.monotonic()
+        watcher.main([])
+        cycle_seconds.append(time.monotonic() - started)
+        if not cycle:
+            # 初回サイクルは全件が新着扱いになるため、到達時間の集計から除く
+            # （上限で打ち切られた検索では2回目以降に初めて配信される物件もあるので、ここで確定する）
+            initial_ids = set(tokyo_r.first_served) | set(renov.first_served)
+        # main.main は呼び出しごとにハンドラを追加するため、サイクルごとに外す
+        for handler in list(logging.getLogger().handlers):
+            logging.getLogger().removeHandler(handler)
+
+    server.shutdown()
+
+    first_served = {**tokyo_r.first_served, **renov.first_served}
+    delays = [
+        line.notified_at[listing_id] - served
+        for listing_id, served in first_served.items()
+        if listing_id in line.notified_at and listing_id not in initial_ids
+    ]
+    served_per_cycle = args.listings * 2
+    return {
+        "cycles": args.cycles,
+        "listings_per_cycle": served_per_cycle,
+        "cycle_seconds_mean": round(statistics.mean(cycle_seconds), 3),
+        "cycle_seconds_max": round(max(cycle_seconds), 3),
+        "throughput_listings_per_second": round(served_per_cycle / statistics.mean(cycle_seconds), 1),
+        "renov_requests": server.renov_requests,
+        "image_requests": sum(server.image_requests.values()),
+        "duplicate_image_requests": sum(n - 1 for n in server.image_requests.values()),
+        "line_status_counts": line.status_counts,
+        "notified_listings": len(delays),
+        "new_listings_after_initial": len(first_served) - len(initial_ids),
+        "time_to_notify_p50": _percentile(delays, 0.5),
+        "time_to_notify_p95": _percentile(delays, 0.95),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="不動産監視のローカル負荷試験")
+    parser.add_argument("--listings", type=int, default=200, help="1サイトあたりの掲載物件数")
+    parser.add_argument("--cycles", type=int, default=3, help="main.main の実行回数")
+    parser.add_argument("--turnover", type=float, default=0.05, help="サイクルごとに入れ替わる物件の割合")
+    parser.add_argument("--latency", type=float, default=0.0, help="検索ページの応答遅延（秒）")
+    parser.add_argument("--renov-cap", type=int, default=50, help="リノベ百貨店の1回の検索で返す件数の上限（0で無制限）")
+    parser.add_argument("--line-rate", type=float, default=0.0, help="LINE APIの許容リクエスト数/秒（0で無制限）")
+    parser.add_argument("--line-burst", type=int, default=5, help="LINE APIのバースト許容数")
+    parser.add_argument("--line-error-rate", type=float, default=0.0, help="LINE APIが500を返す割合")
+    parser.add_argument("--recipients", type=int, default=0, help="通知先の人数（0でブロードキャスト）")
+    parser.add_argument("--data-dir", default="", help="物件データの保存先（省略時は一時ディレクトリ）")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    report = run_harness(parse_args())
+    print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -2,22 +2,59 @@
 """不動産 新着物件監視ツール（東京R不動産 + リノベ百貨店）"""
 import logging
 import sys
+import time
+from dataclasses import dataclass
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
-
-from config import LOG_FILE, LINE_CHANNEL_ACCESS_TOKEN
+from typing import Optional
+
+from config import (
+    LOG_FILE,
+    LINE_CHANNEL_ACCESS_TOKEN,
+    PUSH_SERVER_HOST,
+    PUSH_SERVER_PORT,
+    WATCH_INTERVAL_SECONDS,
+)
 from scraper import (
     fetch_properties,
     load_saved_properties,
     save_properties,
     find_new_properties,
+    find_changed_properties,
 )
 from scraper_renov import (
     fetch_renov_properties,
     load_renov_saved_properties,
     save_renov_properties,
 )
-from notifier import notify_new_properties
+from notifier import DeliveryReport, deliver_new_properties, deliver_keyword_matches, thumbnail_targets
+from dedup import suppress_cross_site_duplicates
+from search_index import SearchIndex, find_keyword_matches
+from stations import filter_by_commute
+from history import record_history
+from push_server import publish_listings, remove_listings, start_push_server
+from coordination import (
+    Coordinator,
+    claim_properties,
+    forget_properties,
+    keyword_event,
+    load_shared_snapshot,
+    release_properties,
+    save_shared_snapshot,
+)
+from thumbnails import prepare_thumbnails
+from recipients import Recipient, RecipientsError, load_recipients
+
+
+@dataclass
+class WatchContext:
+    """1サイクルの監視で各サイトが共有する状態"""
+    search_index: SearchIndex
+    report: DeliveryReport
+    coordinator: Optional[Coordinator] = None
+    # 通知先（Noneはブロードキャスト）と、通知しない場合の理由（空なら通知する）
+    recipients: Optional[list[Recipient]] = None
+    notify_skip_reason: str = ""
 
 
 def setup_logging():
@@ -47,7 +84,63 @@ def setup_logging():
     return logger
 
 
-def watch_tokyo_r(logger) -> bool:
+def screen_properties(properties, other_site_properties, other_site_name: str):
+    """他サイトで掲載済みの同一物件と、通勤時間の条件に合わない物件を通知対象から除く"""
+    properties = suppress_cross_site_duplicates(properties, other_site_properties, other_site_name)
+    return filter_by_commute(properties)
+
+
+def watch_keywords(
+    logger, context: WatchContext, site: str, site_name: str, properties,
+    new_ids: set[str], other_site_properties, other_site_name: str,
+) -> None:
+    """変更物件のキーワード一致を通知（新着物件は新着通知で扱うため除く）"""
+    matches = find_keyword_matches(context.search_index, site, properties)
+    candidates = {
+        p.id: p for matched in matches.values() for p in matched if p.id not in new_ids
+    }
+    allowed = {
+        p.id for p in screen_properties(list(candidates.values()), other_site_properties, other_site_name)
+    }
+    matches = {
+        profile_name: [p for p in matched if p.id in allowed]
+        for profile_name, matched in matches.items()
+    }
+    matches = {profile_name: matched for profile_name, matched in matches.items() if matched}
+    if not matches:
+        return
+
+    for profile_name, matched in matches.items():
+        logger.info(f"{site_name} キーワード一致 [{profile_name}]: {len(matched)}件")
+
+    def event(profile_name: str):
+        # 掲載内容が変わるたびに通知できるよう、通知キーに内容のハッシュを含める
+        return lambda prop: keyword_event(profile_name, context.search_index.doc_hash(site, prop.id))
+
+    if not context.notify_skip_reason:
+        for profile_name, matched in list(matches.items()):
+            claimed = claim_properties(context.coordinator, site, matched, event(profile_name))
+            if claimed:
+                matches[profile_name] = claimed
+            else:
+                del matches[profile_name]
+        delivery = deliver_keyword_matches(matches, site, site_name, context.recipients)
+        context.report.add(delivery)
+        logger.info(f"{site_name} キーワード通知送信: {delivery}")
+        if delivery.api_calls and delivery.failed_calls == delivery.api_calls:
+            for profile_name, matched in matches.items():
+                release_properties(context.coordinator, site, matched, event(profile_name))
+            # インデックスは送信前に更新済みのため、次回のサイクルで再び一致を判定させる
+            context.search_index.mark_pending(site, [p.id for matched in matches.values() for p in matched])
+    else:
+        print(f"\n=== {site_name} キーワード一致（通知なし）===")
+        for profile_name, matched in matches.items():
+            for prop in matched:
+                print(f"\n[{profile_name}] {prop.title}")
+                print(f"{prop.url}")
+
+
+def watch_tokyo_r(logger, context: WatchContext) -> bool:
     """東京R不動産の監視"""
     logger.info("-" * 30)
     logger.info("東京R不動産 監視開始")
@@ -58,21 +151,36 @@ def watch_tokyo_r(logger) -> bool:
             logger.warning("東京R不動産: 物件を取得できませんでした")
             return False
 
-        saved_properties = load_saved_properties()
+        # 複数ホストで動かす場合は他のワーカーが更新した共有のスナップショットと比較する
+        saved_properties = load_shared_snapshot(context.coordinator, "tokyo_r", load_saved_properties)
         logger.info(f"東京R不動産 保存済み物件数: {len(saved_properties)}")
 
         new_properties = find_new_properties(current_properties, saved_properties)
+        new_ids = {p.id for p in new_properties}
+        publish_listings("tokyo_r", new_properties, "new")
+        publish_listings("tokyo_r", find_changed_properties(current_properties, saved_properties), "changed")
+        # リノベ百貨店で掲載済みの同一物件は通知しない
+        other_site_properties = list(
+            load_shared_snapshot(context.coordinator, "renov", load_renov_saved_properties).values()
+        )
+        new_properties = screen_properties(new_properties, other_site_properties, "リノベ百貨店")
 
         if new_properties:
             logger.info(f"東京R不動産 新着物件を検出: {len(new_properties)}件")
             for prop in new_properties:
                 logger.info(f"  - {prop.title} ({prop.rent} / {prop.area})")
 
-            if LINE_CHANNEL_ACCESS_TOKEN:
-                notified = notify_new_properties(new_properties, "東京R不動産")
-                logger.info(f"東京R不動産 LINE通知送信: {notified}件")
+            if not context.notify_skip_reason:
+                claimed = claim_properties(context.coordinator, "tokyo_r", new_properties, "new")
+                # 通知で表示する物件の画像だけを取得する
+                images = prepare_thumbnails("tokyo_r", thumbnail_targets(claimed, "tokyo_r", context.recipients))
+                delivery = deliver_new_properties(claimed, "tokyo_r", "東京R不動産", context.recipients, images)
+                context.report.add(delivery)
+                logger.info(f"東京R不動産 LINE通知送信: {delivery}")
+                if delivery.api_calls and delivery.failed_calls == delivery.api_calls:
+                    release_properties(context.coordinator, "tokyo_r", claimed, "new")
             else:
-                logger.warning("LINE Messaging API設定が未完了のため通知をスキップ")
+                logger.warning(f"{context.notify_skip_reason}のため通知をスキップ")
                 print("\n=== 東京R不動産 新着物件（通知なし）===")
                 for prop in new_properties:
                     print(f"\n{prop.title}")
@@ -83,7 +191,18 @@ def watch_tokyo_r(logger) -> bool:
         else:
             logger.info("東京R不動産 新着物件はありません")
 
+        watch_keywords(
+            logger, context, "tokyo_r", "東京R不動産", current_properties,
+            new_ids, other_site_properties, "リノベ百貨店",
+        )
+
+        record_history("tokyo_r", current_properties, saved_properties)
+        current_ids = {p.id for p in current_properties}
+        disappeared = [p for p in saved_properties.values() if p.id not in current_ids]
+        forget_properties(context.coordinator, "tokyo_r", disappeared)
+        remove_listings("tokyo_r", disappeared)
         save_properties(current_properties)
+        save_shared_snapshot(context.coordinator, "tokyo_r", current_properties)
         return True
 
     except Exception as e:
@@ -91,32 +210,49 @@ def watch_tokyo_r(logger) -> bool:
         return False
 
 
-def watch_renov(logger) -> bool:
+def watch_renov(logger, context: WatchContext) -> bool:
     """リノベ百貨店の監視"""
     logger.info("-" * 30)
     logger.info("リノベ百貨店 監視開始")
 
     try:
-        current_properties = fetch_renov_properties()
+        # 複数ホストで動かす場合は他のワーカーが更新した共有のスナップショットと比較する
+        saved_properties = load_shared_snapshot(context.coordinator, "renov", load_renov_saved_properties)
+
+        # 検索結果が打ち切られた賃料帯の保存済み物件は引き継ぐため、保存済みの一覧を渡す
+        current_properties = fetch_renov_properties(saved_properties)
         if not current_properties:
             logger.warning("リノベ百貨店: 物件を取得できませんでした")
             return False
 
-        saved_properties = load_renov_saved_properties()
         logger.info(f"リノベ百貨店 保存済み物件数: {len(saved_properties)}")
 
         new_properties = find_new_properties(current_properties, saved_properties)
+        new_ids = {p.id for p in new_properties}
+        publish_listings("renov", new_properties, "new")
+        publish_listings("renov", find_changed_properties(current_properties, saved_properties), "changed")
+        # 東京R不動産で掲載済みの同一物件は通知しない
+        other_site_properties = list(
+            load_shared_snapshot(context.coordinator, "tokyo_r", load_saved_properties).values()
+        )
+        new_properties = screen_properties(new_properties, other_site_properties, "東京R不動産")
 
         if new_properties:
             logger.info(f"リノベ百貨店 新着物件を検出: {len(new_properties)}件")
             for prop in new_properties:
                 logger.info(f"  - {prop.title} ({prop.rent} / {prop.area})")
 
-            if LINE_CHANNEL_ACCESS_TOKEN:
-                notified = notify_new_properties(new_properties, "リノベ百貨店")
-                logger.info(f"リノベ百貨店 LINE通知送信: {notified}件")
+            if not context.notify_skip_reason:
+                claimed = claim_properties(context.coordinator, "renov", new_properties, "new")
+                # 通知で表示する物件の画像だけを取得する
+                images = prepare_thumbnails("renov", thumbnail_targets(claimed, "renov", context.recipients))
+                delivery = deliver_new_properties(claimed, "renov", "リノベ百貨店", context.recipients, images)
+                context.report.add(delivery)
+                logger.info(f"リノベ百貨店 LINE通知送信: {delivery}")
+                if delivery.api_calls and delivery.failed_calls == delivery.api_calls:
+                    release_properties(context.coordinator, "renov", claimed, "new")
             else:
-                logger.warning("LINE Messaging API設定が未完了のため通知をスキップ")
+                logger.warning(f"{context.notify_skip_reason}のため通知をスキップ")
                 print("\n=== リノベ百貨店 新着物件（通知なし）===")
                 for prop in new_properties:
                     print(f"\n{prop.title}")
@@ -127,7 +263,18 @@ def watch_renov(logger) -> bool:
         else:
             logger.info("リノベ百貨店 新着物件はありません")
 
+        watch_keywords(
+            logger, context, "renov", "リノベ百貨店", current_properties,
+            new_ids, other_site_properties, "東京R不動産",
+        )
+
+        record_history("renov", current_properties, saved_properties)
+        current_ids = {p.id for p in current_properties}
+        disappeared = [p for p in saved_properties.values() if p.id not in current_ids]
+        forget_properties(context.coordinator, "renov", disappeared)
+        remove_listings("renov", disappeared)
         save_renov_properties(current_properties)
+        save_shared_snapshot(context.coordinator, "renov", current_properties)
         return True
 
     except Exception as e:
@@ -135,19 +282,43 @@ def watch_renov(logger) -> bool:
         return False
 
 
-def main():
-    """メイン処理"""
-    logger = setup_logging()
+def run_cycle(logger) -> int:
+    """1回分の監視処理"""
     logger.info("=" * 50)
     logger.info("不動産監視 開始")
     logger.info(f"実行時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
+    context = WatchContext(
+        search_index=SearchIndex.load(),
+        report=DeliveryReport(),
+        coordinator=Coordinator.from_config(),
+    )
+    # 通知先はサイト・キーワードごとに読み直さず、1サイクルにつき1回だけ読み込む
+    if not LINE_CHANNEL_ACCESS_TOKEN:
+        context.notify_skip_reason = "LINE Messaging API設定が未完了"
+    else:
+        try:
+            context.recipients = load_recipients()
+        except RecipientsError as e:
+            logger.error(f"{e}（希望条件を無視して全員に送らないよう、今回は通知しません）")
+            context.notify_skip_reason = "通知先ファイルが不正"
+    sites = ["tokyo_r", "renov"]
+    if context.coordinator:
+        # 複数ホストで動かす場合は担当サイトのみ監視する
+        sites = context.coordinator.sites_to_watch(sites)
+        if not sites:
+            logger.info("担当サイトがないため監視をスキップします")
+            return 0
+
     # 東京R不動産の監視
-    tokyo_r_ok = watch_tokyo_r(logger)
+    tokyo_r_ok = watch_tokyo_r(logger, context) if "tokyo_r" in sites else False
 
     # リノベ百貨店の監視
-    renov_ok = watch_renov(logger)
+    renov_ok = watch_renov(logger, context) if "renov" in sites else False
+
+    context.search_index.save()
 
+    logger.info(f"配信レポート: {context.report}")
     logger.info("=" * 50)
     logger.info("監視完了")
 
@@ -155,5 +326,26 @@ def main():
     return 0 if (tokyo_r_ok or renov_ok) else 1
 
 
+def watch_loop(logger) -> int:
+    """配信サーバーを起動し、一定間隔で監視を繰り返す"""
+    start_push_server(PUSH_SERVER_HOST, PUSH_SERVER_PORT)
+    # 配信サーバーの初期状態として保存済みの物件を登録
+    publish_listings("tokyo_r", load_saved_properties().values(), "snapshot")
+    publish_listings("renov", load_renov_saved_properties().values(), "snapshot")
+
+    while True:
+        run_cycle(logger)
+        time.sleep(WATCH_INTERVAL_SECONDS)
+
+
+def main(argv=None):
+    """メイン処理（--serve 指定時は配信サーバー付きで常駐）"""
+    argv = sys.argv[1:] if argv is None else argv
+    logger = setup_logging()
+    if "--serve" in argv:
+        return watch_loop(logger)
+    return run_cycle(logger)
+
+
 if __name__ == "__main__":
     sys.exit(main())
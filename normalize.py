@@ -0,0 +1,82 @@
+"""物件情報の正規化モジュール（サイト間で表記の揺れる項目を比較可能な値に変換）"""
+import re
+import unicodedata
+from typing import Optional
+
+# 賃料（例: "22万円（税込）", "17万8,000円", "21万5,000～53万円"）
+_RENT_MAN_PATTERN = re.compile(r'(\d+)万([\d,]*)円?')
+# 賃料（例: "210,000円/5,000円"）
+_RENT_YEN_PATTERN = re.compile(r'([\d,]+)円')
+# 管理費（例: "210,000円/5,000円" の "/" 以降）
+_FEE_PATTERN = re.compile(r'/\s*([\d,]+)円')
+# 面積（例: "40.04㎡", "66.57～74.43㎡"）
+_AREA_PATTERN = re.compile(r'(\d+(?:\.\d+)?)')
+# 駅名（例: "中央線「中野」駅 徒歩7分", "千歳烏山駅徒歩5分"）
+_STATION_BRACKET_PATTERN = re.compile(r'「([^」]+)」')
+_STATION_PLAIN_PATTERN = re.compile(r'([^\s・「」]+?)駅')
+# 所在地に賃料・面積が混入している場合の切り出し（例: "港区赤坂17万8,000円 / 51.04㎡"）
+_LOCATION_NOISE_PATTERN = re.compile(r'\d[\d,]*万.*$|\d[\d,]*円.*$|\s*/.*$')
+
+
+def normalize_text(text: str) -> str:
+    """全角・半角や空白の揺れを吸収した比較用テキストを返す"""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = text.replace("ヶ", "ケ").replace("ヵ", "カ")
+    return re.sub(r'\s+', "", text).lower()
+
+
+def parse_rent_yen(rent: str) -> Optional[int]:
+    """賃料表記を円単位の整数に変換（範囲表記は下限、管理費は含めない）"""
+    text = unicodedata.normalize("NFKC", rent or "")
+    match = _RENT_MAN_PATTERN.search(text)
+    if match:
+        rest = match.group(2).replace(",", "")
+        return int(match.group(1)) * 10000 + (int(rest) if rest else 0)
+
+    match = _RENT_YEN_PATTERN.search(text)
+    if match:
+        return int(match.group(1).replace(",", ""))
+    return None
+
+
+def parse_fee_yen(rent: str) -> Optional[int]:
+    """賃料表記に併記された管理費を円単位の整数に変換（併記がない場合はNone）"""
+    match = _FEE_PATTERN.search(unicodedata.normalize("NFKC", rent or ""))
+    return int(match.group(1).replace(",", "")) if match else None
+
+
+def parse_area_sqm(area: str) -> Optional[float]:
+    """面積表記を㎡単位の数値に変換（範囲表記は下限）"""
+    text = unicodedata.normalize("NFKC", area or "")
+    match = _AREA_PATTERN.search(text)
+    if not match:
+        return None
+    return float(match.group(1))
+
+
+def normalize_station(station: str) -> str:
+    """駅情報から駅名のみを取り出す（路線名・徒歩分数は除く）"""
+    text = unicodedata.normalize("NFKC", station or "")
+    match = _STATION_BRACKET_PATTERN.search(text)
+    if match:
+        return normalize_text(match.group(1))
+
+    match = _STATION_PLAIN_PATTERN.search(text)
+    if match:
+        return normalize_text(match.group(1))
+    return ""
+
+
+def normalize_location(location: str) -> str:
+    """所在地から都道府県名と混入した賃料・面積を取り除く"""
+    text = unicodedata.normalize("NFKC", location or "").strip()
+    text = _LOCATION_NOISE_PATTERN.sub("", text)
+    text = re.sub(r'^(?:東京都|神奈川県|埼玉県|千葉県)', "", text)
+    return normalize_text(text)
+
+
+def extract_ward(location: str) -> str:
+    """所在地から区市町村名を取り出す（例: "港区赤坂" -> "港区"）"""
+    text = normalize_location(location)
+    match = re.match(r'(.+?市.+?区|.+?[区市町村])', text)
+    return match.group(1) if match else ""
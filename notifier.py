@@ -1,17 +1,32 @@
 """LINE通知モジュール（Messaging API版）"""
 import json
 import logging
+from dataclasses import dataclass
+from typing import Callable, Optional
 
 import requests
 
-from config import LINE_CHANNEL_ACCESS_TOKEN, LINE_MESSAGING_API
+from config import (
+    LINE_CAROUSEL_MAX_BUBBLES,
+    LINE_CHANNEL_ACCESS_TOKEN,
+    LINE_MESSAGING_API,
+    LINE_MULTICAST_API,
+    LINE_MULTICAST_MAX_RECIPIENTS,
+    LINE_RICH_MESSAGES,
+)
+from recipients import Recipient
 from scraper import Property
 
 logger = logging.getLogger(__name__)
 
 
-def send_line_notification(message: str) -> bool:
-    """LINE Messaging APIでブロードキャストメッセージを送信（友だち全員に通知）"""
+def text_message(text: str) -> dict:
+    """テキストメッセージ（Messaging APIは5000文字が上限）"""
+    return {"type": "text", "text": text[:5000]}
+
+
+def send_line_messages(messages: list[dict]) -> bool:
+    """LINE Messaging APIでブロードキャストメッセージを送信（友だち全員に通知、最大5件）"""
     if not LINE_CHANNEL_ACCESS_TOKEN:
         logger.warning("LINE_CHANNEL_ACCESS_TOKENが設定されていません")
         return False
@@ -21,16 +36,8 @@ def send_line_notification(message: str) -> bool:
         "Content-Type": "application/json"
     }
 
-    # Messaging APIは5000文字が上限
-    truncated_message = message[:5000] if len(message) > 5000 else message
-
     data = {
-        "messages": [
-            {
-                "type": "text",
-                "text": truncated_message
-            }
-        ]
+        "messages": messages[:5]
     }
 
     try:
@@ -51,9 +58,14 @@ def send_line_notification(message: str) -> bool:
         return False
 
 
-def notify_new_property(prop: Property, site_name: str = "東京R不動産") -> bool:
-    """新着物件をLINEに通知"""
-    message = f"""【新着物件】{site_name}
+def send_line_notification(message: str) -> bool:
+    """LINE Messaging APIでブロードキャストメッセージを送信（友だち全員に通知）"""
+    return send_line_messages([text_message(message)])
+
+
+def format_new_property(prop: Property, site_name: str = "東京R不動産") -> str:
+    """新着物件1件分の通知メッセージ"""
+    return f"""【新着物件】{site_name}
 
 {prop.title}
 
@@ -62,7 +74,100 @@ def notify_new_property(prop: Property, site_name: str = "東京R不動産") ->
 {prop.station}
 
 {prop.url}"""
-    return send_line_notification(message)
+
+
+def format_new_properties(properties: list[Property], site_name: str = "東京R不動産") -> list[str]:
+    """複数の新着物件の通知メッセージ（物件数が多い場合は1通にまとめる）"""
+    if len(properties) > 3:
+        summary = f"【新着物件】{site_name}\n\n{len(properties)}件の新着物件があります！\n"
+        for prop in properties[:5]:
+            summary += f"\n{prop.title}\n{prop.rent} / {prop.area}\n{prop.url}\n"
+        if len(properties) > 5:
+            summary += f"\n...他{len(properties) - 5}件"
+        return [summary]
+    return [format_new_property(prop, site_name) for prop in properties]
+
+
+def _flex_text(text: str, **style) -> dict:
+    # Flexのtextは空文字を受け付けない
+    return {"type": "text", "text": text or "-", "wrap": True, **style}
+
+
+def format_property_bubble(prop: Property, site_name: str, image_url: Optional[str] = None) -> dict:
+    """物件1件分のFlexバブル（サムネイルがあれば上部に表示）"""
+    bubble = {
+        "type": "bubble",
+        "body": {
+            "type": "box",
+            "layout": "vertical",
+            "spacing": "sm",
+            "contents": [
+                _flex_text(f"【新着物件】{site_name}", size="xs", color="#888888"),
+                _flex_text(prop.title, weight="bold", size="md"),
+                _flex_text(f"{prop.rent} / {prop.area}", size="sm"),
+                _flex_text(prop.station or prop.location, size="xs", color="#666666"),
+            ],
+        },
+        "footer": {
+            "type": "box",
+            "layout": "vertical",
+            "contents": [
+                {"type": "button", "style": "link", "action": {"type": "uri", "label": "物件を見る", "uri": prop.url}},
+            ],
+        },
+    }
+    if image_url:
+        bubble["hero"] = {
+            "type": "image",
+            "url": image_url,
+            "size": "full",
+            "aspectRatio": "4:3",
+            "aspectMode": "cover",
+            "action": {"type": "uri", "uri": prop.url},
+        }
+    return bubble
+
+
+def rendered_properties(properties: list[Property]) -> list[Property]:
+    """新着通知で画像付きで表示する物件（4件以上はカルーセルに入る先頭の物件だけ）"""
+    if len(properties) > 3:
+        return properties[:LINE_CAROUSEL_MAX_BUBBLES]
+    return properties
+
+
+def format_new_property_messages(
+    properties: list[Property], site_name: str, images: Optional[dict[str, str]] = None
+) -> list[dict]:
+    """新着物件の通知メッセージ（サムネイルがあればFlexメッセージ、なければテキスト）"""
+    texts = format_new_properties(properties, site_name)
+    if not LINE_RICH_MESSAGES or not images:
+        return [text_message(text) for text in texts]
+
+    if len(properties) > 3:
+        # まとめ通知の後に、先頭の物件をカルーセルで表示
+        carousel = {
+            "type": "carousel",
+            "contents": [
+                format_property_bubble(p, site_name, images.get(p.id)) for p in rendered_properties(properties)
+            ],
+        }
+        alt_text = f"【新着物件】{site_name} {len(properties)}件"
+        return [text_message(texts[0]), {"type": "flex", "altText": alt_text, "contents": carousel}]
+
+    return [
+        {
+            "type": "flex",
+            "altText": f"【新着物件】{site_name} {prop.title}"[:400],
+            "contents": format_property_bubble(prop, site_name, images[prop.id]),
+        }
+        if prop.id in images else text_message(text)
+        for prop, text in zip(properties, texts)
+    ]
+
+
+def notify_new_property(prop: Property, site_name: str = "東京R不動産") -> bool:
+    """新着物件をLINEに通知"""
+    return send_line_notification(format_new_property(prop, site_name))
 
 
 def notify_new_properties(properties: list[Property], site_name: str = "東京R不動産") -> int:
@@ -70,25 +175,167 @@ def notify_new_properties(properties: list[Property], site_name: str = "東京R
     if not properties:
         return 0
 
-    success_count = 0
-
+    messages = format_new_properties(properties, site_name)
     # 物件数が多い場合はまとめて通知
     if len(properties) > 3:
-        summary = f"【新着物件】{site_name}\n\n{len(properties)}件の新着物件があります！\n"
-        for prop in properties[:5]:
-            summary += f"\n{prop.title}\n{prop.rent} / {prop.area}\n{prop.url}\n"
-        if len(properties) > 5:
-            summary += f"\n...他{len(properties) - 5}件"
+        return len(properties) if send_line_notification(messages[0]) else 0
+
+    # 個別に通知
+    return sum(1 for message in messages if send_line_notification(message))
+
+
+def format_keyword_matches(profile_name: str, properties: list[Property], site_name: str) -> list[dict]:
+    """キーワード通知プロファイルに一致した物件の通知メッセージ"""
+    message = f"【キーワード一致: {profile_name}】{site_name}\n"
+    for prop in properties[:5]:
+        message += f"\n{prop.title}\n{prop.rent} / {prop.area}\n{prop.url}\n"
+    if len(properties) > 5:
+        message += f"\n...他{len(properties) - 5}件"
+    return [text_message(message)]
+
+
+@dataclass
+class DeliveryReport:
+    """1サイクル分の配信結果"""
+    api_calls: int = 0
+    failed_calls: int = 0
+    payloads: int = 0
+    recipients: int = 0
+    properties: int = 0
+
+    def add(self, other: "DeliveryReport") -> None:
+        self.api_calls += other.api_calls
+        self.failed_calls += other.failed_calls
+        self.payloads += other.payloads
+        self.recipients += other.recipients
+        self.properties += other.properties
+
+    def __str__(self) -> str:
+        return (
+            f"API呼び出し{self.api_calls}回（失敗{self.failed_calls}回） "
+            f"メッセージ{self.payloads}種類 送信先{self.recipients}人 物件{self.properties}件"
+        )
+
+
+def send_line_multicast(user_ids: list[str], messages: list[dict]) -> bool:
+    """LINE Messaging APIで指定したユーザーにメッセージを送信（最大500人）"""
+    if not LINE_CHANNEL_ACCESS_TOKEN:
+        logger.warning("LINE_CHANNEL_ACCESS_TOKENが設定されていません")
+        return False
+
+    headers = {
+        "Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}",
+        "Content-Type": "application/json"
+    }
+    # 1リクエストあたりメッセージは5件が上限
+    data = {
+        "to": user_ids,
+        "messages": messages[:5],
+    }
+
+    try:
+        response = requests.post(
+            LINE_MULTICAST_API,
+            headers=headers,
+            data=json.dumps(data),
+            timeout=10
+        )
+        if response.status_code == 200:
+            return True
+        logger.error(f"LINEマルチキャストの送信に失敗: {response.status_code} {response.text}")
+        return False
+    except Exception as e:
+        logger.error(f"LINEマルチキャストの送信中にエラー: {e}")
+        return False
+
+
+def deliver_properties(
+    properties: list[Property],
+    site: str,
+    recipients: Optional[list[Recipient]],
+    render: Callable[[list[Property]], list[dict]],
+) -> DeliveryReport:
+    """通知先ごとに希望条件に合う物件だけを送信
+
+    同じ内容のメッセージになる通知先をまとめ、500人ずつマルチキャストする。
+    通知先がNone（未設定）の場合は従来どおり友だち全員にブロードキャストする。
+    """
+    report = DeliveryReport()
+    if not properties:
+        return report
+
+    if recipients is None:
+        report.api_calls = 1
+        report.payloads = 1
+        if not send_line_messages(render(properties)):
+            report.failed_calls = 1
+        report.properties = len(properties)
+        return report
+
+    delivered_ids = set()
+    for matched, user_ids in group_recipients(properties, site, recipients):
+        delivered_ids.update(p.id for p in matched)
+        messages = render(matched)
+        report.payloads += 1
+        report.recipients += len(user_ids)
+        for i in range(0, len(user_ids), LINE_MULTICAST_MAX_RECIPIENTS):
+            report.api_calls += 1
+            if not send_line_multicast(user_ids[i:i + LINE_MULTICAST_MAX_RECIPIENTS], messages):
+                report.failed_calls += 1
+    report.properties = len(delivered_ids)
+    return report
+
+
+def group_recipients(
+    properties: list[Property], site: str, recipients: list[Recipient]
+) -> list[tuple[list[Property], list[str]]]:
+    """希望条件に合う物件の組み合わせごとに通知先をまとめる（メッセージは組み合わせごとに1回だけ作る）"""
+    groups: dict[tuple[str, ...], tuple[list[Property], list[str]]] = {}
+    for recipient in recipients:
+        matched = [p for p in properties if recipient.matches(p, site)]
+        if matched:
+            groups.setdefault(tuple(p.id for p in matched), (matched, []))[1].append(recipient.user_id)
+    return list(groups.values())
+
+
+def thumbnail_targets(
+    properties: list[Property], site: str, recipients: Optional[list[Recipient]]
+) -> list[Property]:
+    """新着通知のいずれかのメッセージで画像を表示する物件（サムネイルはこれだけ取得すればよい）"""
+    if recipients is None:
+        return rendered_properties(properties)
+
+    targets: dict[str, Property] = {}
+    for matched, _ in group_recipients(properties, site, recipients):
+        for prop in rendered_properties(matched):
+            targets.setdefault(prop.id, prop)
+    return list(targets.values())
+
+
+def deliver_new_properties(
+    properties: list[Property],
+    site: str,
+    site_name: str,
+    recipients: Optional[list[Recipient]],
+    images: Optional[dict[str, str]] = None,
+) -> DeliveryReport:
+    """新着物件を通知先ごとに送信（imagesは物件IDごとのサムネイルURL）"""
+    return deliver_properties(
+        properties, site, recipients, lambda props: format_new_property_messages(props, site_name, images)
+    )
 
-        if send_line_notification(summary):
-            success_count = len(properties)
-    else:
-        # 個別に通知
-        for prop in properties:
-            if notify_new_property(prop, site_name):
-                success_count += 1
 
-    return success_count
+def deliver_keyword_matches(
+    matches: dict[str, list[Property]], site: str, site_name: str, recipients: Optional[list[Recipient]]
+) -> DeliveryReport:
+    """キーワード一致の物件を通知先ごとに送信"""
+    report = DeliveryReport()
+    for profile_name, properties in matches.items():
+        report.add(deliver_properties(
+            properties, site, recipients,
+            lambda props: format_keyword_matches(profile_name, props, site_name),
+        ))
+    return report
 
 
 if __name__ == "__main__":
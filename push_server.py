@@ -0,0 +1,255 @@
+"""新着物件のローカル配信サーバーモジュール
+
+監視ループと同じプロセスで軽量なHTTPサーバーを起動し、Webアプリに新着・変更物件を即時に届ける。
+掲載終了した物件は "removed" イベントとして配信し、since=0 の一覧からは除く。
+- GET /listings?since=<seq>&site=<site> : メモリ上の物件インデックス（ETag対応、since以降の差分取得）
+- GET /events                           : Server-Sent Eventsで新着・変更・掲載終了の物件をプッシュ
+- GET /thumbnails/<name>                 : 縮小済みサムネイル（thumbnails.py のキャッシュ）
+
+サーバーは専用スレッドの1つのイベントループで動かし、待機中の購読者は
+コルーチン1つとキュー1つだけを持つので、数百の同時接続でもスレッドは増えない。
+"""
+import asyncio
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from config import PUSH_HEARTBEAT_SECONDS, PUSH_SUBSCRIBER_QUEUE_SIZE, THUMBNAIL_CACHE_DIR
+from scraper import Property
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ListingEntry:
+    """インデックス上の物件"""
+    seq: int
+    site: str
+    event: str
+    prop: Property
+
+    def to_dict(self) -> dict:
+        return {"seq": self.seq, "site": self.site, "event": self.event, **self.prop.to_dict()}
+
+
+class ListingStore:
+    """物件のメモリ上インデックス（更新ごとに連番を振る）"""
+
+    def __init__(self):
+        self._entries: dict[tuple[str, str], ListingEntry] = {}
+        self._lock = threading.Lock()
+        self.seq = 0
+
+    def upsert(self, site: str, properties: Iterable[Property], event: str) -> list[ListingEntry]:
+        updated = []
+        with self._lock:
+            for prop in properties:
+                self.seq += 1
+                entry = ListingEntry(seq=self.seq, site=site, event=event, prop=prop)
+                self._entries[(site, prop.id)] = entry
+                updated.append(entry)
+        return updated
+
+    def remove(self, site: str, properties: Iterable[Property]) -> list[ListingEntry]:
+        """掲載終了した物件を "removed" として記録（差分取得する購読者に削除を伝えるため残す）"""
+        return self.upsert(site, properties, "removed")
+
+    def since(self, seq: int, site: Optional[str] = None) -> tuple[int, list[ListingEntry]]:
+        """指定した連番より後に更新された物件を返す（全件取得では掲載終了した物件を除く）"""
+        with self._lock:
+            entries = [
+                e for e in self._entries.values()
+                if e.seq > seq and (site is None or e.site == site)
+                and (seq > 0 or e.event != "removed")
+            ]
+            latest = self.seq
+        entries.sort(key=lambda e: e.seq)
+        return latest, entries
+
+
+class PushServer:
+    """/listings と /events を配信するHTTPサーバー"""
+
+    def __init__(self, store: ListingStore, host: str, port: int):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._ready = threading.Event()
+
+    def start(self) -> None:
+        """専用スレッドでイベントループを起動"""
+        threading.Thread(target=self._run, name="push-server", daemon=True).start()
+        self._ready.wait()
+
+    def _run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        logger.info(f"配信サーバーを起動しました: http://{self.host}:{self.port}")
+        self._ready.set()
+        self.loop.run_forever()
+
+    def publish(self, entries: list[ListingEntry]) -> None:
+        """監視スレッドから呼び出し、購読者へ配信する"""
+        if self.loop and entries:
+            self.loop.call_soon_threadsafe(self._broadcast, entries)
+
+    def _broadcast(self, entries: list[ListingEntry]) -> None:
+        for queue in list(self._subscribers):
+            for entry in entries:
+                try:
+                    queue.put_nowait(entry)
+                except asyncio.QueueFull:
+                    # 読み出しの遅い購読者は切断し、Last-Event-IDで再接続させる
+                    self._subscribers.discard(queue)
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(None)
+                    break
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            url = urlsplit(target)
+            query = parse_qs(url.query)
+            if method != "GET":
+                await self._respond(writer, 405, b"method not allowed")
+            elif url.path == "/listings":
+                await self._listings(writer, query, headers)
+            elif url.path == "/events":
+                await self._events(writer, headers)
+            elif url.path.startswith("/thumbnails/"):
+                await self._thumbnail(writer, url.path[len("/thumbnails/"):])
+            else:
+                await self._respond(writer, 404, b"not found")
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(
+        self, writer: asyncio.StreamWriter, status: int, body: bytes,
+        content_type: str = "text/plain; charset=utf-8", extra_headers: Optional[dict] = None,
+    ) -> None:
+        reasons = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+        lines = [
+            f"HTTP/1.1 {status} {reasons.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Access-Control-Allow-Origin: *",
+            "Connection: close",
+        ]
+        lines += [f"{name}: {value}" for name, value in (extra_headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _listings(self, writer: asyncio.StreamWriter, query: dict, headers: dict) -> None:
+        since_text = query.get("since", ["0"])[0] or "0"
+        if not since_text.isdigit():
+            await self._respond(writer, 400, b"since must be a non-negative integer")
+            return
+        since = int(since_text)
+        site = query.get("site", [None])[0]
+        latest, entries = self.store.since(since, site)
+        # 同じsince・siteの応答は最新の連番が変わらない限り同一内容
+        etag = f'"{latest}-{since}-{site or ""}"'
+        if headers.get("if-none-match") == etag:
+            await self._respond(writer, 304, b"", extra_headers={"ETag": etag})
+            return
+
+        body = json.dumps(
+            {"seq": latest, "listings": [e.to_dict() for e in entries]}, ensure_ascii=False
+        ).encode("utf-8")
+        await self._respond(writer, 200, body, "application/json; charset=utf-8", {"ETag": etag})
+
+    async def _thumbnail(self, writer: asyncio.StreamWriter, name: str) -> None:
+        path = THUMBNAIL_CACHE_DIR / name
+        # キャッシュディレクトリ外のファイルは返さない
+        if "/" in name or ".." in name or not path.is_file():
+            await self._respond(writer, 404, b"not found")
+            return
+        body = await asyncio.to_thread(path.read_bytes)
+        await self._respond(writer, 200, body, "image/jpeg", {"Cache-Control": "max-age=86400"})
+
+    async def _events(self, writer: asyncio.StreamWriter, headers: dict) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Access-Control-Allow-Origin: *\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+        )
+        queue: asyncio.Queue = asyncio.Queue(maxsize=PUSH_SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        try:
+            # 再接続時は取りこぼした分から送る
+            last_event_id = headers.get("last-event-id")
+            if last_event_id and last_event_id.isdigit():
+                _, missed = self.store.since(int(last_event_id))
+                for entry in missed:
+                    writer.write(_format_event(entry))
+            await writer.drain()
+
+            while True:
+                try:
+                    entry = await asyncio.wait_for(queue.get(), PUSH_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b": heartbeat\n\n")
+                else:
+                    if entry is None:
+                        break
+                    writer.write(_format_event(entry))
+                await writer.drain()
+        finally:
+            self._subscribers.discard(queue)
+
+
+def _format_event(entry: ListingEntry) -> bytes:
+    data = json.dumps(entry.to_dict(), ensure_ascii=False)
+    return f"id: {entry.seq}\nevent: {entry.event}\ndata: {data}\n\n".encode("utf-8")
+
+
+# 監視処理からはモジュール関数経由で配信する（サーバー未起動時はインデックスの更新のみ）
+_store = ListingStore()
+_server: Optional[PushServer] = None
+
+
+def start_push_server(host: str, port: int) -> PushServer:
+    """配信サーバーを起動"""
+    global _server
+    _server = PushServer(_store, host, port)
+    _server.start()
+    return _server
+
+
+def publish_listings(site: str, properties: Iterable[Property], event: str) -> None:
+    """新着・変更物件をインデックスに反映し、購読者へ配信"""
+    entries = _store.upsert(site, properties, event)
+    if _server:
+        _server.publish(entries)
+
+
+def remove_listings(site: str, properties: Iterable[Property]) -> None:
+    """掲載終了した物件をインデックスから外し、購読者へ "removed" として配信"""
+    entries = _store.remove(site, properties)
+    if _server:
+        _server.publish(entries)
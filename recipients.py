@@ -0,0 +1,100 @@
+"""通知先ユーザーと希望条件の管理モジュール
+
+data/recipients.json（環境変数 LINE_RECIPIENTS_FILE で変更可能）に通知先ごとの希望条件を書く。
+例:
+    [
+      {"user_id": "Uxxxxxxxx", "sites": ["tokyo_r"], "max_rent": 250000, "min_area": 45},
+      {"user_id": "Uyyyyyyyy", "wards": ["港区", "渋谷区"], "keywords": ["ペット"]}
+    ]
+ファイルがない場合は従来どおり友だち全員にブロードキャストする。
+ファイルが不正な場合はブロードキャストせず、LINE_USER_ID のユーザーにだけ送るか、通知をスキップする。
+LINE_NOTIFY_USER_ID_ONLY=true のときは、代わりに LINE_USER_ID のユーザーにだけすべての物件を通知する。
+"""
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+
+from config import LINE_NOTIFY_USER_ID_ONLY, LINE_USER_ID, RECIPIENTS_FILE
+from normalize import (
+    extract_ward,
+    normalize_station,
+    normalize_text,
+    parse_area_sqm,
+    parse_rent_yen,
+)
+from scraper import Property
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Recipient:
+    """通知先ユーザーと希望条件（未指定の条件は絞り込まない）"""
+    user_id: str
+    sites: list[str] = field(default_factory=list)
+    max_rent: Optional[int] = None
+    min_area: Optional[float] = None
+    wards: list[str] = field(default_factory=list)
+    stations: list[str] = field(default_factory=list)
+    keywords: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Recipient":
+        return cls(**data)
+
+    def matches(self, prop: Property, site: str) -> bool:
+        """物件が希望条件に合うか"""
+        if self.sites and site not in self.sites:
+            return False
+
+        rent = parse_rent_yen(prop.rent)
+        if self.max_rent is not None and (rent is None or rent > self.max_rent):
+            return False
+
+        area = parse_area_sqm(prop.area)
+        if self.min_area is not None and (area is None or area < self.min_area):
+            return False
+
+        if self.wards and extract_ward(prop.location) not in self.wards:
+            return False
+
+        if self.stations and normalize_station(prop.station) not in {
+            normalize_text(s) for s in self.stations
+        }:
+            return False
+
+        if self.keywords:
+            text = normalize_text(" ".join([prop.title, prop.location, prop.description]))
+            if not any(normalize_text(k) in text for k in self.keywords):
+                return False
+        return True
+
+
+class RecipientsError(Exception):
+    """通知先ファイルが不正"""
+
+
+def _default_recipients() -> Optional[list[Recipient]]:
+    if LINE_NOTIFY_USER_ID_ONLY and LINE_USER_ID:
+        return [Recipient(user_id=LINE_USER_ID)]
+    return None
+
+
+def load_recipients() -> Optional[list[Recipient]]:
+    """通知先を読み込む（Noneの場合はブロードキャストで通知する）
+
+    通知先ファイルが不正な場合、希望条件を無視して全員に送らないよう、LINE_USER_ID が
+    設定されていればそのユーザーにだけ送り、なければ RecipientsError を送出する。
+    """
+    if not RECIPIENTS_FILE.exists():
+        return _default_recipients()
+
+    try:
+        with open(RECIPIENTS_FILE, "r", encoding="utf-8") as f:
+            return [Recipient.from_dict(r) for r in json.load(f)]
+    except Exception as e:
+        if LINE_USER_ID:
+            logger.error(f"通知先の読み込みに失敗したため LINE_USER_ID のユーザーにだけ通知します: {RECIPIENTS_FILE} {e}")
+            return [Recipient(user_id=LINE_USER_ID)]
+        raise RecipientsError(f"通知先の読み込みに失敗: {RECIPIENTS_FILE} {e}") from e
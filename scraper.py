@@ -4,6 +4,7 @@ import json
 import logging
 from dataclasses import dataclass, asdict
 from typing import Optional
+from urllib.parse import urljoin
 
 import requests
 from bs4 import BeautifulSoup
@@ -24,6 +25,7 @@ class Property:
     station: str
     url: str
     description: str = ""
+    image_url: str = ""
 
     def to_dict(self) -> dict:
         return asdict(self)
@@ -150,6 +152,14 @@ def parse_property_link(link) -> Optional[Property]:
                 description = p_text[:100]
                 break
 
+        # サムネイル画像（遅延読み込みの場合は data-src）
+        image_url = ""
+        img = link.find("img")
+        if img:
+            src = img.get("data-src") or img.get("src") or ""
+            if src:
+                image_url = urljoin(BASE_URL, src)
+
         if not title:
             title = f"物件 {property_id}"
 
@@ -161,7 +171,8 @@ def parse_property_link(link) -> Optional[Property]:
             area=area,
             station=station,
             url=url,
-            description=description
+            description=description,
+            image_url=image_url
         )
 
     except Exception as e:
@@ -202,6 +213,18 @@ def find_new_properties(current: list[Property], saved: dict[str, Property]) ->
     return new_properties
 
 
+# 変更の検出に使う掲載内容の項目（画像URLなど後から追加した項目の差分では変更扱いにしない）
+CHANGE_FIELDS = ("title", "location", "rent", "area", "station", "description")
+
+
+def find_changed_properties(current: list[Property], saved: dict[str, Property]) -> list[Property]:
+    """掲載内容（賃料など）が変わった物件を検出"""
+    return [
+        p for p in current
+        if p.id in saved and any(getattr(saved[p.id], f) != getattr(p, f) for f in CHANGE_FIELDS)
+    ]
+
+
 if __name__ == "__main__":
     # テスト実行
     logging.basicConfig(level=logging.INFO)
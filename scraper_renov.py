@@ -2,77 +2,262 @@
 import re
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urljoin, urlparse
 
 import requests
 from bs4 import BeautifulSoup
 
-from config import RENOV_SEARCH_URL, RENOV_BASE_URL, RENOV_PROPERTIES_FILE
+from config import (
+    RENOV_SEARCH_URL,
+    RENOV_BASE_URL,
+    RENOV_PROPERTIES_FILE,
+    RENOV_MADORI_CODES,
+    RENOV_RENT_RANGE,
+    RENOV_RESULT_CAP,
+    RENOV_MAX_CONCURRENCY,
+    RENOV_MAX_REQUESTS_PER_CYCLE,
+    RENOV_SHARD_COUNTS_FILE,
+)
+from normalize import parse_rent_yen
 from scraper import Property
 
 logger = logging.getLogger(__name__)
 
+# 接続先ホストごとの同時接続数の制限
+_host_semaphores: dict[str, threading.BoundedSemaphore] = {}
+_host_semaphores_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class RenovQuery:
+    """検索条件の分割単位（間取りと賃料帯）"""
+    madori: tuple[str, ...]
+    price_from: int
+    price_to: int
+
+    @property
+    def key(self) -> str:
+        return f"{','.join(self.madori)}|{self.price_from}-{self.price_to}"
+
+    def contains(self, other: "RenovQuery") -> bool:
+        return (
+            set(other.madori) <= set(self.madori)
+            and self.price_from <= other.price_from
+            and other.price_to <= self.price_to
+        )
+
+    @property
+    def splittable(self) -> bool:
+        return self.price_to - self.price_from > 1
+
+    def covers_rent(self, rent_yen: Optional[int]) -> bool:
+        return rent_yen is not None and self.price_from * 10000 <= rent_yen <= self.price_to * 10000
+
+    def split_rent(self) -> tuple["RenovQuery", "RenovQuery"]:
+        """賃料帯を半分に分割（境界の物件はIDで重複除去するため境界値は両方に含める）"""
+        middle = (self.price_from + self.price_to) // 2
+        return (
+            RenovQuery(self.madori, self.price_from, middle),
+            RenovQuery(self.madori, middle, self.price_to),
+        )
+
+    def form_data(self) -> list[tuple[str, str]]:
+        """検索フォームのPOSTデータ"""
+        # 検索条件:
+        # - 家賃: price_from万円〜price_to万円
+        # - 間取り: 1LDK(203), 2K(205), 2DK(302), 2LDK(303) のうち指定したもの
+        # - 設備: 0169（バス・トイレ別など）
+        # - 募集中のみ
+        return [
+            ("price[]", str(self.price_from)),
+            ("price[]", str(self.price_to)),
+            ("cond_money_combo", "1"),
+            ("b_area[]", "0"),
+            ("b_area[]", "99999"),
+            ("eki_walk", "0"),
+            *[("madori[]", code) for code in self.madori],
+            ("setsubi_cd[]", "0169"),
+            ("state_check", "2"),
+            ("city_cd", ""),
+            ("pref_cd_all", ""),
+            ("ensen_cd", ""),
+            ("eki_cd", ""),
+            ("sch_flg", ""),
+            ("pref_cd1", ""),
+            ("pref_cd2", ""),
+            ("required_time", ""),
+            ("required_time2", ""),
+            ("transfer_num", ""),
+            ("transfer_num2", ""),
+            ("ekitan_eki_name", ""),
+            ("ekitan_eki_name2", ""),
+            ("freeword", ""),
+            ("item_div", ""),
+            ("state", "2"),
+            ("eki_json_flg", ""),
+            ("categoly", ""),
+        ]
+
+
+def _is_capped(count: int) -> bool:
+    return bool(RENOV_RESULT_CAP) and count >= RENOV_RESULT_CAP
+
+
+def plan_renov_queries(
+    counts: dict[str, int], budget: int = RENOV_MAX_REQUESTS_PER_CYCLE
+) -> tuple[list[RenovQuery], list[RenovQuery]]:
+    """間取りごとの検索条件を、前回の件数が上限に達していたものから賃料帯で分割する
+
+    分割後の検索条件の数は budget までとし、分割した中間の検索条件も合わせて返す。
+    """
+    price_from, price_to = RENOV_RENT_RANGE
+    leaves = [RenovQuery((code,), price_from, price_to) for code in RENOV_MADORI_CODES]
+    internal: list[RenovQuery] = []
+    i = 0
+    while i < len(leaves):
+        query = leaves[i]
+        count = counts.get(query.key)
+        if count is not None and _is_capped(count) and query.splittable and len(leaves) < budget:
+            internal.append(query)
+            leaves[i:i + 1] = query.split_rent()
+            continue
+        i += 1
+    return leaves, internal
+
+
+def load_renov_shard_counts() -> dict[str, int]:
+    """前回の検索条件ごとの取得件数を読み込む"""
+    if not RENOV_SHARD_COUNTS_FILE.exists():
+        return {}
+
+    try:
+        with open(RENOV_SHARD_COUNTS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"リノベ百貨店の検索件数キャッシュの読み込みに失敗: {e}")
+        return {}
+
+
+def save_renov_shard_counts(counts: dict[str, int]) -> None:
+    """検索条件ごとの取得件数を保存"""
+    try:
+        with open(RENOV_SHARD_COUNTS_FILE, "w", encoding="utf-8") as f:
+            json.dump(counts, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.error(f"リノベ百貨店の検索件数キャッシュの保存に失敗: {e}")
 
-def fetch_renov_properties() -> list[Property]:
-    """リノベ百貨店から物件一覧を取得（POSTリクエスト）"""
-    logger.info(f"リノベ百貨店から物件情報を取得中: {RENOV_SEARCH_URL}")
 
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    host = urlparse(url).netloc
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(RENOV_MAX_CONCURRENCY)
+        return _host_semaphores[host]
+
+
+def fetch_renov_query(query: RenovQuery) -> list[Property]:
+    """1つの検索条件で物件一覧を取得（同一ホストへの同時接続数は上限まで）"""
     headers = {
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
         "Content-Type": "application/x-www-form-urlencoded",
     }
 
-    # 検索条件:
-    # - 家賃: 15万円〜30万円
-    # - 間取り: 1LDK(203), 2K(205), 2DK(302), 2LDK(303)
-    # - 設備: 0169（バス・トイレ別など）
-    # - 募集中のみ
-    form_data = [
-        ("price[]", "15"),
-        ("price[]", "30"),
-        ("cond_money_combo", "1"),
-        ("b_area[]", "0"),
-        ("b_area[]", "99999"),
-        ("eki_walk", "0"),
-        ("madori[]", "203"),
-        ("madori[]", "205"),
-        ("madori[]", "302"),
-        ("madori[]", "303"),
-        ("setsubi_cd[]", "0169"),
-        ("state_check", "2"),
-        ("city_cd", ""),
-        ("pref_cd_all", ""),
-        ("ensen_cd", ""),
-        ("eki_cd", ""),
-        ("sch_flg", ""),
-        ("pref_cd1", ""),
-        ("pref_cd2", ""),
-        ("required_time", ""),
-        ("required_time2", ""),
-        ("transfer_num", ""),
-        ("transfer_num2", ""),
-        ("ekitan_eki_name", ""),
-        ("ekitan_eki_name2", ""),
-        ("freeword", ""),
-        ("item_div", ""),
-        ("state", "2"),
-        ("eki_json_flg", ""),
-        ("categoly", ""),
-    ]
-
-    response = requests.post(RENOV_SEARCH_URL, data=form_data, headers=headers, timeout=30)
+    with _host_semaphore(RENOV_SEARCH_URL):
+        response = requests.post(RENOV_SEARCH_URL, data=query.form_data(), headers=headers, timeout=30)
     response.raise_for_status()
     response.encoding = "utf-8"
 
     soup = BeautifulSoup(response.text, "html.parser")
     properties = []
+    seen_ids = set()
 
     # property-item クラスの div を探す
     for item in soup.find_all("div", class_="property-item"):
         prop = parse_renov_property(item)
-        if prop and prop.id not in [p.id for p in properties]:
+        if prop and prop.id not in seen_ids:
+            seen_ids.add(prop.id)
             properties.append(prop)
+    return properties
+
+
+def fetch_renov_properties(saved: Optional[dict[str, Property]] = None) -> list[Property]:
+    """リノベ百貨店から物件一覧を取得（検索条件を分割して並行にPOSTし、結果を統合）
 
-    logger.info(f"リノベ百貨店: {len(properties)}件の物件を取得しました")
+    上限に達した検索条件はその場で賃料帯を分割して取り直す。これ以上分割できないか、
+    1回のリクエスト数の上限に達した場合は打ち切られた結果を使い、その賃料帯で取得できなかった
+    保存済みの物件（saved）は掲載終了とみなさずに引き継ぐ。
+    """
+    logger.info(f"リノベ百貨店から物件情報を取得中: {RENOV_SEARCH_URL}")
+
+    counts = load_renov_shard_counts()
+    pending, internal = plan_renov_queries(counts)
+    logger.info(f"リノベ百貨店: {len(pending)}件の検索条件に分割して取得します")
+
+    results: dict[RenovQuery, list[Property]] = {}
+    truncated: list[RenovQuery] = []
+    request_count = 0
+    while pending:
+        fetched: dict[RenovQuery, list[Property]] = {}
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            futures = {executor.submit(fetch_renov_query, query): query for query in pending}
+            for future in as_completed(futures):
+                # 1件でも失敗した場合は一部の物件だけで掲載終了と誤判定しないよう全体を失敗とする
+                fetched[futures[future]] = future.result()
+        request_count += len(pending)
+
+        # 上限に達した検索条件は打ち切られているため、同じ回のうちに分割して取り直す
+        pending = []
+        for query in sorted(fetched, key=lambda q: q.key):
+            shard = fetched[query]
+            if not _is_capped(len(shard)):
+                results[query] = shard
+            elif query.splittable and request_count + len(pending) + 2 <= RENOV_MAX_REQUESTS_PER_CYCLE:
+                logger.info(f"リノベ百貨店: 検索結果が上限に達したため分割して再取得します: {query.key}")
+                internal.append(query)
+                pending.extend(query.split_rent())
+            else:
+                logger.warning(f"リノベ百貨店: 検索結果が上限に達しましたが分割できないため打ち切られた結果を使います: {query.key}")
+                results[query] = shard
+                truncated.append(query)
+
+    queries = sorted(results, key=lambda q: q.key)
+    properties = []
+    seen_ids = set()
+    new_counts = {}
+    for query in queries:
+        shard = results[query]
+        new_counts[query.key] = len(shard)
+        for prop in shard:
+            if prop.id not in seen_ids:
+                seen_ids.add(prop.id)
+                properties.append(prop)
+
+    # 分割前の検索条件の件数は子の合計とし、件数が減れば次回は分割せずに検索する
+    for parent in internal:
+        new_counts[parent.key] = len({
+            prop.id for query in queries if parent.contains(query) for prop in results[query]
+        })
+    save_renov_shard_counts(new_counts)
+
+    if truncated and saved:
+        # 打ち切られた賃料帯の保存済み物件は、取得できなかっただけの可能性があるため引き継ぐ
+        # （一覧に間取りがないため、間取りを問わず賃料帯が重なる物件を対象とする）
+        carried = [
+            prop for prop in saved.values()
+            if prop.id not in seen_ids and any(q.covers_rent(parse_rent_yen(prop.rent)) for q in truncated)
+        ]
+        if carried:
+            logger.info(f"リノベ百貨店: 打ち切られた検索条件の保存済み物件を引き継ぎます: {len(carried)}件")
+            properties.extend(carried)
+
+    logger.info(
+        f"リノベ百貨店: {len(properties)}件の物件を取得しました"
+        f"（{len(queries)}件の検索条件、リクエスト{request_count}回）"
+    )
     return properties
 
 
@@ -122,6 +307,14 @@ def parse_renov_property(item) -> Property | None:
             if area_match:
                 area = area_match.group(1)
 
+        # サムネイル画像（遅延読み込みの場合は data-src）
+        image_url = ""
+        img = item.find("img")
+        if img:
+            src = img.get("data-src") or img.get("src") or ""
+            if src:
+                image_url = urljoin(RENOV_BASE_URL, src)
+
         if not title:
             title = f"物件 {property_id}"
 
@@ -133,6 +326,7 @@ def parse_renov_property(item) -> Property | None:
             area=area,
             station=station,
             url=url,
+            image_url=image_url,
         )
 
     except Exception as e:
@@ -0,0 +1,209 @@
+"""物件説明文の全文検索インデックスモジュール
+
+日本語は単語区切りがないため、正規化したテキストを文字bi-gramに分割して転置インデックスを作る。
+インデックスは物件データと同じ data/ に保存し、毎回の取得結果で差分更新する。
+キーワード通知は新着・変更のあった物件のみを対象に評価する（送信に失敗した物件は次回も評価する）。
+"""
+import hashlib
+import json
+import logging
+import re
+import sys
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from config import KEYWORD_ALERT_PROFILES, SEARCH_INDEX_FILE
+from normalize import normalize_text
+from scraper import Property
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 2
+
+# 検索クエリの語（"..." で囲むとフレーズとして扱う）
+_QUERY_TERM_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def tokenize(text: str) -> set[str]:
+    """テキストを文字n-gramの集合に分割"""
+    normalized = normalize_text(text)
+    if len(normalized) < NGRAM_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + NGRAM_SIZE] for i in range(len(normalized) - NGRAM_SIZE + 1)}
+
+
+def parse_query(query: str) -> list[str]:
+    """クエリを正規化済みの語のリストに分割（すべての語を含む物件が一致）"""
+    terms = []
+    for match in _QUERY_TERM_PATTERN.finditer(query):
+        term = normalize_text(match.group(1) or match.group(2))
+        if term:
+            terms.append(term)
+    return terms
+
+
+def doc_key(site: str, property_id: str) -> str:
+    return f"{site}:{property_id}"
+
+
+def _doc_text(prop: Property) -> str:
+    return normalize_text(" ".join([prop.title, prop.location, prop.station, prop.description]))
+
+
+class SearchIndex:
+    """物件の転置インデックス"""
+
+    def __init__(self, docs: Optional[dict] = None, postings: Optional[dict] = None):
+        self.docs: dict[str, dict] = docs or {}
+        self.postings: dict[str, set[str]] = defaultdict(set)
+        for token, keys in (postings or {}).items():
+            self.postings[token] = set(keys)
+
+    @classmethod
+    def load(cls) -> "SearchIndex":
+        """保存済みのインデックスを読み込む"""
+        if not SEARCH_INDEX_FILE.exists():
+            return cls()
+
+        try:
+            with open(SEARCH_INDEX_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                return cls(data.get("docs"), data.get("postings"))
+        except Exception as e:
+            logger.error(f"検索インデックスの読み込みに失敗: {e}")
+            return cls()
+
+    def save(self) -> None:
+        """インデックスを保存"""
+        try:
+            data = {
+                "docs": self.docs,
+                "postings": {token: sorted(keys) for token, keys in self.postings.items()},
+            }
+            with open(SEARCH_INDEX_FILE, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            logger.info(f"検索インデックスを保存しました: {SEARCH_INDEX_FILE}")
+        except Exception as e:
+            logger.error(f"検索インデックスの保存に失敗: {e}")
+
+    def _remove(self, key: str) -> None:
+        doc = self.docs.pop(key, None)
+        if not doc:
+            return
+        for token in tokenize(doc["text"]):
+            keys = self.postings.get(token)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[token]
+
+    def update(self, site: str, properties: Iterable[Property]) -> list[str]:
+        """物件を追加・更新し、新規または内容の変わった文書のキーを返す"""
+        changed = []
+        for prop in properties:
+            key = doc_key(site, prop.id)
+            text = _doc_text(prop)
+            digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            existing = self.docs.get(key)
+            if existing and existing["hash"] == digest and not existing.get("pending"):
+                continue
+
+            self._remove(key)
+            self.docs[key] = {
+                "site": site,
+                "id": prop.id,
+                "title": prop.title,
+                "url": prop.url,
+                "text": text,
+                "hash": digest,
+            }
+            for token in tokenize(text):
+                self.postings[token].add(key)
+            changed.append(key)
+        return changed
+
+    def mark_pending(self, site: str, property_ids: Iterable[str]) -> None:
+        """通知できなかった物件を、内容が変わらなくても次回の更新で変更として返すようにする"""
+        for property_id in property_ids:
+            doc = self.docs.get(doc_key(site, property_id))
+            if doc:
+                doc["pending"] = True
+
+    def doc_hash(self, site: str, property_id: str) -> str:
+        """登録済みの物件の掲載内容のハッシュ"""
+        return self.docs[doc_key(site, property_id)]["hash"]
+
+    def _match_term(self, term: str, keys: Optional[set[str]]) -> set[str]:
+        """語を含む文書のキーを返す（n-gramで候補を絞り込んでから部分一致で確認）"""
+        candidates: Optional[set[str]] = None
+        if len(term) >= NGRAM_SIZE:
+            for token in tokenize(term):
+                postings = self.postings.get(token, set())
+                candidates = postings if candidates is None else candidates & postings
+                if not candidates:
+                    return set()
+        else:
+            candidates = set(self.docs)
+
+        if keys is not None:
+            candidates = candidates & keys
+        return {key for key in candidates if term in self.docs[key]["text"]}
+
+    def search(self, query: str, keys: Optional[Iterable[str]] = None) -> list[str]:
+        """クエリのすべての語を含む文書のキーを返す（keys指定時はその中から検索）"""
+        terms = parse_query(query)
+        if not terms:
+            return []
+
+        scope = set(keys) if keys is not None else None
+        result: Optional[set[str]] = None
+        for term in sorted(terms, key=len, reverse=True):
+            matched = self._match_term(term, scope if result is None else result)
+            result = matched
+            if not result:
+                return []
+        return sorted(result or ())
+
+    def match_profiles(self, keys: Iterable[str]) -> dict[str, list[str]]:
+        """通知プロファイルごとに一致した文書のキーを返す"""
+        scope = set(keys)
+        if not scope:
+            return {}
+
+        matches = {}
+        for name, queries in KEYWORD_ALERT_PROFILES.items():
+            matched: set[str] = set()
+            for query in queries:
+                matched.update(self.search(query, scope))
+            if matched:
+                matches[name] = sorted(matched)
+        return matches
+
+
+def find_keyword_matches(
+    index: SearchIndex, site: str, properties: list[Property]
+) -> dict[str, list[Property]]:
+    """取得した物件でインデックスを更新し、新着・変更物件のキーワード一致を返す"""
+    is_initial_build = not any(doc["site"] == site for doc in index.docs.values())
+    changed = index.update(site, properties)
+    if is_initial_build:
+        # 初回は既存物件すべてが「新規」になるため通知しない
+        logger.info(f"検索インデックスを初期構築しました: {site} {len(changed)}件")
+        return {}
+
+    by_key = {doc_key(site, p.id): p for p in properties}
+    return {
+        name: [by_key[key] for key in keys]
+        for name, keys in index.match_profiles(changed).items()
+    }
+
+
+if __name__ == "__main__":
+    # 履歴全体からのキーワード検索
+    # 例: python search_index.py ペット可 "ルーフバルコニー"
+    logging.basicConfig(level=logging.INFO)
+    search_index = SearchIndex.load()
+    query = " ".join(f'"{arg}"' if " " in arg else arg for arg in sys.argv[1:])
+    for key in search_index.search(query):
+        doc = search_index.docs[key]
+        print(f"[{doc['site']}] {doc['title']} {doc['url']}")
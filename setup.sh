@@ -61,6 +61,9 @@ if [ -z "$LINE_CHANNEL_ACCESS_TOKEN" ] || [ -z "$LINE_USER_ID" ]; then
 else
     echo "   LINE Messaging API は設定済みです"
 fi
+echo "   通知は友だち全員にブロードキャストされます"
+echo "   LINE_USER_ID のユーザーにだけ送る場合は LINE_NOTIFY_USER_ID_ONLY=true を設定してください"
+echo "   通知先ごとに条件を分ける場合は data/recipients.json を作成してください（recipients.py を参照）"
 echo ""
 
 # 動作テスト
@@ -0,0 +1,250 @@
+"""駅情報の解析と位置検索モジュール
+
+駅情報は "中央線「中野」駅 徒歩7分"（東京R不動産）や "千歳烏山駅徒歩5分"（リノベ百貨店）
+のような自由記述のため、路線・駅名・徒歩分数に分解し、同梱の駅座標表（data/stations.csv）で
+位置を引く。物件はグリッドに登録し、半径検索・最寄り駅検索を近傍セルの走査だけで行う。
+"""
+import csv
+import logging
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Generic, Iterable, Optional, TypeVar
+
+from config import (
+    COMMUTE_KEEP_UNKNOWN,
+    COMMUTE_MAX_MINUTES,
+    COMMUTE_ORIGIN_STATION,
+    COMMUTE_OVERHEAD_MINUTES,
+    COMMUTE_TRAIN_SPEED_KMPH,
+    STATIONS_FILE,
+)
+from normalize import normalize_station, normalize_text
+from scraper import Property
+
+logger = logging.getLogger(__name__)
+
+# グリッドのセルサイズ（度）。東京付近で緯度方向約1.1km
+GRID_CELL_DEGREES = 0.01
+EARTH_RADIUS_KM = 6371.0
+
+# 徒歩分数（例: "徒歩7分", "徒歩 13 分"）
+_WALK_PATTERN = re.compile(r'徒歩\s*(\d+)\s*分')
+# 路線名（例: "日比谷線・都営浅草線「人形町」駅" の「」より前）
+_LINES_PATTERN = re.compile(r'^(.*?)「')
+
+T = TypeVar("T")
+
+
+@dataclass
+class StationInfo:
+    """駅情報を分解したもの"""
+    station: str
+    lines: list[str] = field(default_factory=list)
+    walk_minutes: Optional[int] = None
+
+
+def parse_station_info(text: str) -> StationInfo:
+    """駅情報の自由記述から路線・駅名・徒歩分数を取り出す"""
+    normalized = unicodedata.normalize("NFKC", text or "")
+
+    lines = []
+    match = _LINES_PATTERN.search(normalized)
+    if match:
+        lines = [line.strip() for line in match.group(1).split("・") if line.strip()]
+
+    walk_minutes = None
+    match = _WALK_PATTERN.search(normalized)
+    if match:
+        walk_minutes = int(match.group(1))
+
+    return StationInfo(station=normalize_station(normalized), lines=lines, walk_minutes=walk_minutes)
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """2点間の距離（km、正距円筒近似。都市圏の距離なら誤差は無視できる）"""
+    mean_lat = math.radians((lat1 + lat2) / 2)
+    x = math.radians(lon2 - lon1) * math.cos(mean_lat)
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_KM * math.hypot(x, y)
+
+
+class GeoGrid(Generic[T]):
+    """緯度経度の固定サイズグリッドによる空間インデックス"""
+
+    def __init__(self, cell_degrees: float = GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._cells: dict[tuple[int, int], list[tuple[float, float, T]]] = defaultdict(list)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def insert(self, lat: float, lon: float, item: T) -> None:
+        self._cells[self._cell(lat, lon)].append((lat, lon, item))
+        self._size += 1
+
+    def _ring(self, center: tuple[int, int], radius: int) -> Iterable[tuple[float, float, T]]:
+        """中心セルからちょうどradiusセル離れたセル（外周のみ）の要素を返す"""
+        ci, cj = center
+        if radius == 0:
+            yield from self._cells.get(center, ())
+            return
+        for j in range(cj - radius, cj + radius + 1):
+            yield from self._cells.get((ci - radius, j), ())
+            yield from self._cells.get((ci + radius, j), ())
+        for i in range(ci - radius + 1, ci + radius):
+            yield from self._cells.get((i, cj - radius), ())
+            yield from self._cells.get((i, cj + radius), ())
+
+    def _cell_span_km(self, lat: float) -> float:
+        """セル1辺の最短距離（経度方向は緯度で縮む）"""
+        return math.radians(self.cell_degrees) * EARTH_RADIUS_KM * math.cos(math.radians(lat))
+
+    def within(self, lat: float, lon: float, radius_km: float) -> list[tuple[float, T]]:
+        """半径内の要素を距離の近い順に返す"""
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / math.cos(math.radians(lat))
+        min_i, min_j = self._cell(lat - dlat, lon - dlon)
+        max_i, max_j = self._cell(lat + dlat, lon + dlon)
+        results = []
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                for item_lat, item_lon, item in self._cells.get((i, j), ()):
+                    d = distance_km(lat, lon, item_lat, item_lon)
+                    if d <= radius_km:
+                        results.append((d, item))
+        results.sort(key=lambda r: r[0])
+        return results
+
+    def nearest(self, lat: float, lon: float) -> Optional[tuple[float, T]]:
+        """最も近い要素を返す"""
+        if not self._size:
+            return None
+
+        center = self._cell(lat, lon)
+        span = self._cell_span_km(lat)
+        best: Optional[tuple[float, T]] = None
+        ring = 0
+        # 見つかった最短距離より内側のリングをすべて調べ終えるまで広げる
+        while best is None or (ring - 1) * span <= best[0]:
+            for item_lat, item_lon, item in self._ring(center, ring):
+                d = distance_km(lat, lon, item_lat, item_lon)
+                if best is None or d < best[0]:
+                    best = (d, item)
+            ring += 1
+        return best
+
+
+class StationTable:
+    """同梱の駅座標表"""
+
+    def __init__(self, rows: Iterable[tuple[str, float, float]]):
+        self._coords: dict[str, tuple[float, float]] = {}
+        self._grid: GeoGrid[str] = GeoGrid()
+        for name, lat, lon in rows:
+            key = normalize_text(name)
+            self._coords[key] = (lat, lon)
+            self._grid.insert(lat, lon, key)
+
+    @classmethod
+    def load(cls) -> "StationTable":
+        rows = []
+        try:
+            with open(STATIONS_FILE, "r", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    rows.append((row["name"], float(row["lat"]), float(row["lon"])))
+        except Exception as e:
+            logger.error(f"駅座標表の読み込みに失敗: {e}")
+        return cls(rows)
+
+    def lookup(self, station: str) -> Optional[tuple[float, float]]:
+        """駅名（正規化済みでなくてもよい）から座標を返す"""
+        return self._coords.get(normalize_text(station))
+
+    def nearest_station(self, lat: float, lon: float) -> Optional[tuple[float, str]]:
+        """最寄り駅と距離（km）を返す"""
+        return self._grid.nearest(lat, lon)
+
+
+@lru_cache(maxsize=1)
+def get_station_table() -> StationTable:
+    return StationTable.load()
+
+
+class ListingGeoIndex:
+    """物件を最寄り駅の座標で登録した空間インデックス"""
+
+    def __init__(self, properties: Iterable[Property] = (), table: Optional[StationTable] = None):
+        self.table = table or get_station_table()
+        self.grid: GeoGrid[tuple[Property, StationInfo]] = GeoGrid()
+        self.unknown: list[Property] = []
+        for prop in properties:
+            self.add(prop)
+
+    def add(self, prop: Property) -> bool:
+        """物件を登録（駅座標が不明な場合はFalse）"""
+        info = parse_station_info(prop.station)
+        coords = self.table.lookup(info.station) if info.station else None
+        if not coords:
+            self.unknown.append(prop)
+            return False
+        self.grid.insert(coords[0], coords[1], (prop, info))
+        return True
+
+    def within(self, lat: float, lon: float, radius_km: float) -> list[tuple[float, Property, StationInfo]]:
+        """半径内の物件を距離の近い順に返す"""
+        return [(d, prop, info) for d, (prop, info) in self.grid.within(lat, lon, radius_km)]
+
+
+def estimate_commute_minutes(distance: float, walk_minutes: Optional[int]) -> float:
+    """駅間距離と徒歩分数から所要時間（分）を概算"""
+    train_minutes = distance / COMMUTE_TRAIN_SPEED_KMPH * 60
+    return (walk_minutes or 0) + COMMUTE_OVERHEAD_MINUTES + train_minutes
+
+
+def filter_by_commute(
+    properties: list[Property],
+    origin_station: str = COMMUTE_ORIGIN_STATION,
+    max_minutes: float = COMMUTE_MAX_MINUTES,
+) -> list[Property]:
+    """指定駅まで所要時間内の物件のみを返す（駅座標が不明な物件は設定に従う）"""
+    if not origin_station or not properties:
+        return properties
+
+    table = get_station_table()
+    origin = table.lookup(origin_station)
+    if not origin:
+        logger.warning(f"通勤フィルタの基準駅が駅座標表にありません: {origin_station}")
+        return properties
+
+    index = ListingGeoIndex(properties, table)
+    # 徒歩0分の場合の上限距離で候補を絞り込み、徒歩分数を含めて判定する
+    radius_km = max(0.0, max_minutes - COMMUTE_OVERHEAD_MINUTES) / 60 * COMMUTE_TRAIN_SPEED_KMPH
+    accepted_ids = set()
+    for distance, prop, info in index.within(origin[0], origin[1], radius_km):
+        if estimate_commute_minutes(distance, info.walk_minutes) <= max_minutes:
+            accepted_ids.add(prop.id)
+
+    if index.unknown:
+        # 駅座標表の不足が分かるよう、座標を引けなかった駅名を記録する
+        names = sorted({parse_station_info(p.station).station or p.station or "(駅情報なし)" for p in index.unknown})
+        logger.warning(f"駅座標表にない駅: {', '.join(names)}")
+    if COMMUTE_KEEP_UNKNOWN:
+        accepted_ids.update(p.id for p in index.unknown)
+    elif index.unknown:
+        logger.info(f"駅座標が不明な物件を除外: {len(index.unknown)}件")
+
+    filtered = [p for p in properties if p.id in accepted_ids]
+    if len(filtered) < len(properties):
+        logger.info(
+            f"通勤フィルタ（{origin_station}まで{max_minutes}分以内）で除外: "
+            f"{len(properties) - len(filtered)}件"
+        )
+    return filtered
@@ -0,0 +1,56 @@
+"""複数ホストの協調（通知キー）のテスト"""
+from coordination import (
+    Coordinator,
+    claim_properties,
+    forget_properties,
+    keyword_event,
+    release_properties,
+)
+from scraper import Property
+
+
+def prop(property_id: str) -> Property:
+    return Property(
+        id=property_id, title="t", location="", rent="20万円", area="50㎡",
+        station="乃木坂駅徒歩3分", url=f"https://example.com/{property_id}",
+    )
+
+
+def coordinators(tmp_path):
+    path = str(tmp_path / "coordination.db")
+    return Coordinator(path, "a"), Coordinator(path, "b")
+
+
+def test_only_first_worker_claims(tmp_path):
+    a, b = coordinators(tmp_path)
+    assert claim_properties(a, "renov", [prop("1")], "new")
+    assert claim_properties(b, "renov", [prop("1")], "new") == []
+
+
+def test_released_key_can_be_claimed_again(tmp_path):
+    a, b = coordinators(tmp_path)
+    claim_properties(a, "renov", [prop("1")], "new")
+    release_properties(a, "renov", [prop("1")], "new")
+    assert claim_properties(b, "renov", [prop("1")], "new")
+
+
+def test_keyword_keys_include_content_hash(tmp_path):
+    a, b = coordinators(tmp_path)
+    assert claim_properties(a, "renov", [prop("1")], keyword_event("ペット可", "h1"))
+    assert claim_properties(b, "renov", [prop("1")], keyword_event("ペット可", "h1")) == []
+    # 掲載内容が変われば再び通知する
+    assert claim_properties(b, "renov", [prop("1")], keyword_event("ペット可", "h2"))
+
+
+def test_forget_removes_all_keys_of_disappeared_listing(tmp_path):
+    a, b = coordinators(tmp_path)
+    listing = prop("ka260120_2")
+    other = prop("ka260120_20")
+    claim_properties(a, "renov", [listing, other], "new")
+    claim_properties(a, "renov", [listing], keyword_event("ペット可", "h1"))
+
+    forget_properties(b, "renov", [listing])
+    assert claim_properties(b, "renov", [listing], "new")
+    assert claim_properties(b, "renov", [listing], keyword_event("ペット可", "h1"))
+    # 物件IDの前方が一致するだけの別物件のキーは残る
+    assert claim_properties(b, "renov", [other], "new") == []
@@ -0,0 +1,72 @@
+"""サイト横断の重複検出のテスト"""
+from dedup import find_cross_site_duplicates
+from normalize import parse_fee_yen
+from scraper import Property
+
+
+def tokyo_r(**kwargs) -> Property:
+    data = {
+        "id": "tr1",
+        "title": "かわいげのある赤坂レトロ",
+        "location": "港区赤坂17万8,000円 / 51.04㎡",
+        "rent": "17万8,000円",
+        "area": "51.04㎡",
+        "station": "千代田線「乃木坂」駅 徒歩3分",
+        "url": "https://www.realtokyoestate.co.jp/estate.php?n=1",
+    }
+    data.update(kwargs)
+    return Property(**data)
+
+
+def renov(**kwargs) -> Property:
+    data = {
+        "id": "rv1",
+        "title": "レトロな赤坂のワンルーム",
+        "location": "",
+        "rent": "178,000円",
+        "area": "51.04㎡",
+        "station": "乃木坂駅徒歩3分",
+        "url": "https://www.renov-depart.jp/detail/001/rv1/",
+    }
+    data.update(kwargs)
+    return Property(**data)
+
+
+def test_same_unit_on_both_sites_is_duplicate():
+    # タイトルはサイトごとに異なり、リノベ百貨店には所在地がない
+    matches = find_cross_site_duplicates([renov()], [tokyo_r()])
+    assert len(matches) == 1
+    assert matches[0].existing.id == "tr1"
+    assert matches[0].text_similarity < 0.6
+
+
+def test_walk_minutes_within_one_minute_still_match():
+    assert find_cross_site_duplicates([renov(station="乃木坂駅徒歩4分")], [tokyo_r()])
+
+
+def test_other_unit_in_same_building_is_not_duplicate():
+    # 駅・徒歩分数・賃料が同じでも面積が異なれば別住戸
+    assert not find_cross_site_duplicates([renov(area="51.62㎡")], [tokyo_r()])
+
+
+def test_contradicting_walk_minutes_is_not_duplicate():
+    assert not find_cross_site_duplicates([renov(station="乃木坂駅徒歩9分")], [tokyo_r()])
+
+
+def test_contradicting_fee_is_not_duplicate():
+    existing = renov(id="rv0", rent="178,000円/5,000円")
+    assert not find_cross_site_duplicates([renov(rent="178,000円/8,000円")], [existing])
+
+
+def test_rent_out_of_tolerance_is_not_duplicate():
+    assert not find_cross_site_duplicates([renov(rent="198,000円")], [tokyo_r()])
+
+
+def test_similar_titles_match_without_exact_area():
+    existing = tokyo_r(area="51.3㎡")
+    assert find_cross_site_duplicates([renov(title="かわいげのある赤坂レトロ")], [existing])
+
+
+def test_parse_fee_yen():
+    assert parse_fee_yen("220,000円/5,000円") == 5000
+    assert parse_fee_yen("17万8,000円") is None
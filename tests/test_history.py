@@ -0,0 +1,65 @@
+"""掲載履歴の記録と集計のテスト"""
+import json
+
+import pytest
+
+import history
+from history import compute_stats, iter_events, record_history
+from scraper import Property
+
+
+def prop(property_id: str, rent: str = "20万円") -> Property:
+    return Property(
+        id=property_id, title=property_id, location="東京都港区南青山", rent=rent, area="50㎡",
+        station="乃木坂駅徒歩3分", url=f"https://example.com/{property_id}",
+    )
+
+
+@pytest.fixture
+def history_file(tmp_path, monkeypatch):
+    path = tmp_path / "history.jsonl"
+    monkeypatch.setattr(history, "HISTORY_FILE", path)
+    return path
+
+
+def write_events(path, *events):
+    with open(path, "w", encoding="utf-8") as f:
+        for ts, property_id, event, rent_yen in events:
+            f.write(json.dumps({
+                "ts": ts, "site": "tokyo_r", "id": property_id, "event": event, "rent": "",
+                "rent_yen": rent_yen, "area_sqm": 50.0, "ward": "港区", "seeded": False,
+            }) + "\n")
+
+
+def test_first_run_is_seeded(history_file):
+    record_history("tokyo_r", [prop("1")], {})
+    assert [(e["id"], e["event"], e["seeded"]) for e in iter_events(history_file)] == [("1", "appeared", True)]
+
+
+def test_lost_snapshot_does_not_reset_open_listings(history_file):
+    record_history("tokyo_r", [prop("1"), prop("2")], {})
+    # 保存済みの一覧が失われた後のサイクル: 1は掲載継続・賃料改定、2は掲載終了、3は新着
+    record_history("tokyo_r", [prop("1", rent="18万円"), prop("3")], {})
+    events = [(e["id"], e["event"], e["seeded"]) for e in iter_events(history_file)][2:]
+    assert events == [
+        ("1", "rent_changed", False),
+        ("3", "appeared", False),
+        ("2", "disappeared", False),
+    ]
+
+
+def test_compute_stats_groups_by_ward_and_rent_band(history_file):
+    write_events(
+        history_file,
+        ("2026-01-01T00:00:00", "1", "appeared", 200000),
+        ("2026-01-05T00:00:00", "1", "rent_changed", 180000),
+        ("2026-01-11T00:00:00", "1", "disappeared", 180000),
+        ("2026-01-01T00:00:00", "2", "appeared", 210000),
+        ("2026-01-03T00:00:00", "3", "appeared", 300000),
+    )
+    stats = compute_stats(history_file)
+    assert stats[("港区", "20-25万円")].summary() == {
+        "closed": 1, "active": 1, "median_days": 10.0, "mean_days": 10.0,
+        "price_drop_listings": 1, "mean_drop_pct": 10.0,
+    }
+    assert stats[("港区", "30-35万円")].active == 1
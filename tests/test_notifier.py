@@ -0,0 +1,35 @@
+"""新着通知のサムネイル取得対象のテスト"""
+from notifier import thumbnail_targets
+from recipients import Recipient
+from scraper import Property
+
+
+def props(count: int, rent: str = "20万円") -> list[Property]:
+    return [
+        Property(
+            id=f"{rent}-{i}", title=str(i), location="港区南青山", rent=rent, area="50㎡",
+            station="乃木坂駅徒歩3分", url=f"https://example.com/{i}",
+        )
+        for i in range(count)
+    ]
+
+
+def test_broadcast_fetches_all_when_sent_individually():
+    properties = props(3)
+    assert thumbnail_targets(properties, "renov", None) == properties
+
+
+def test_broadcast_fetches_only_carousel_properties():
+    properties = props(25)
+    assert thumbnail_targets(properties, "renov", None) == properties[:10]
+
+
+def test_recipients_fetch_union_of_rendered_properties():
+    cheap, expensive = props(12), props(12, rent="30万円")
+    targets = thumbnail_targets(cheap + expensive, "renov", [
+        Recipient(user_id="Ua", max_rent=250000),
+        Recipient(user_id="Ub", min_area=100),
+        Recipient(user_id="Uc"),
+    ])
+    # Uaは安い物件の先頭10件、Ucは全物件の先頭10件（Uaと同じ）を表示し、Ubには送らない
+    assert targets == cheap[:10]
@@ -0,0 +1,44 @@
+"""配信サーバーの物件インデックスのテスト"""
+from push_server import ListingStore
+from scraper import Property
+
+
+def prop(property_id: str, rent: str = "20万円") -> Property:
+    return Property(
+        id=property_id, title=property_id, location="", rent=rent, area="50㎡",
+        station="乃木坂駅徒歩3分", url=f"https://example.com/{property_id}",
+    )
+
+
+def test_removed_listing_is_excluded_from_full_listing():
+    store = ListingStore()
+    store.upsert("renov", [prop("1"), prop("2")], "new")
+    store.remove("renov", [prop("1")])
+    _, entries = store.since(0)
+    assert [e.prop.id for e in entries] == ["2"]
+
+
+def test_removed_listing_is_sent_to_incremental_clients():
+    store = ListingStore()
+    store.upsert("renov", [prop("1"), prop("2")], "new")
+    latest, _ = store.since(0)
+    store.remove("renov", [prop("1")])
+    _, entries = store.since(latest)
+    assert [(e.prop.id, e.event) for e in entries] == [("1", "removed")]
+
+
+def test_relisted_listing_is_served_again():
+    store = ListingStore()
+    store.upsert("renov", [prop("1")], "new")
+    store.remove("renov", [prop("1")])
+    store.upsert("renov", [prop("1")], "new")
+    _, entries = store.since(0)
+    assert [(e.prop.id, e.event) for e in entries] == [("1", "new")]
+
+
+def test_since_filters_by_site():
+    store = ListingStore()
+    store.upsert("renov", [prop("1")], "new")
+    store.upsert("tokyo_r", [prop("2")], "new")
+    _, entries = store.since(0, "tokyo_r")
+    assert [e.prop.id for e in entries] == ["2"]
@@ -0,0 +1,68 @@
+"""通知先の読み込みと希望条件ごとの送信のテスト"""
+import pytest
+
+import notifier
+import recipients
+from recipients import Recipient, RecipientsError, load_recipients
+from scraper import Property
+
+
+def prop(property_id: str, rent: str = "20万円", location: str = "港区南青山") -> Property:
+    return Property(
+        id=property_id, title=property_id, location=location, rent=rent, area="50㎡",
+        station="乃木坂駅徒歩3分", url=f"https://example.com/{property_id}",
+    )
+
+
+@pytest.fixture
+def recipients_file(tmp_path, monkeypatch):
+    path = tmp_path / "recipients.json"
+    monkeypatch.setattr(recipients, "RECIPIENTS_FILE", path)
+    monkeypatch.setattr(recipients, "LINE_NOTIFY_USER_ID_ONLY", False)
+    return path
+
+
+def test_missing_file_broadcasts(recipients_file, monkeypatch):
+    monkeypatch.setattr(recipients, "LINE_USER_ID", "Uowner")
+    assert load_recipients() is None
+
+
+def test_malformed_file_sends_only_to_line_user_id(recipients_file, monkeypatch):
+    recipients_file.write_text("[{", encoding="utf-8")
+    monkeypatch.setattr(recipients, "LINE_USER_ID", "Uowner")
+    assert load_recipients() == [Recipient(user_id="Uowner")]
+
+
+def test_malformed_file_without_line_user_id_raises(recipients_file, monkeypatch):
+    recipients_file.write_text('[{"user_id": "Ua", "unknown": 1}]', encoding="utf-8")
+    monkeypatch.setattr(recipients, "LINE_USER_ID", "")
+    with pytest.raises(RecipientsError):
+        load_recipients()
+
+
+def test_recipient_matches_conditions():
+    recipient = Recipient(user_id="Ua", sites=["renov"], max_rent=250000, wards=["港区"])
+    assert recipient.matches(prop("1"), "renov")
+    assert not recipient.matches(prop("1"), "tokyo_r")
+    assert not recipient.matches(prop("1", rent="30万円"), "renov")
+    assert not recipient.matches(prop("1", location="渋谷区神宮前"), "renov")
+
+
+def test_deliver_properties_renders_once_per_matched_set(monkeypatch):
+    sent = []
+    monkeypatch.setattr(notifier, "send_line_multicast", lambda user_ids, messages: sent.append(user_ids) or True)
+    rendered = []
+
+    def render(props):
+        rendered.append([p.id for p in props])
+        return [{"type": "text", "text": ""}]
+
+    targets = [
+        Recipient(user_id="Ua", max_rent=250000),
+        Recipient(user_id="Ub", max_rent=250000),
+        Recipient(user_id="Uc"),
+    ]
+    report = notifier.deliver_properties([prop("1"), prop("2", rent="30万円")], "renov", targets, render)
+    assert rendered == [["1"], ["1", "2"]]
+    assert sent == [["Ua", "Ub"], ["Uc"]]
+    assert (report.api_calls, report.recipients, report.properties) == (2, 3, 2)
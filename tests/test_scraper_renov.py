@@ -0,0 +1,75 @@
+"""リノベ百貨店の検索条件の分割のテスト"""
+import scraper_renov
+from scraper import Property
+from scraper_renov import RenovQuery, plan_renov_queries
+
+
+def prop(property_id: str, rent: str) -> Property:
+    return Property(
+        id=property_id, title=property_id, location="", rent=rent, area="50㎡",
+        station="学芸大学駅徒歩5分", url=f"https://example.com/{property_id}",
+    )
+
+
+def test_plan_without_counts_queries_each_madori():
+    leaves, internal = plan_renov_queries({})
+    assert [q.madori for q in leaves] == [(code,) for code in scraper_renov.RENOV_MADORI_CODES]
+    assert internal == []
+
+
+def test_plan_splits_capped_queries_recursively(monkeypatch):
+    monkeypatch.setattr(scraper_renov, "RENOV_MADORI_CODES", ["203"])
+    monkeypatch.setattr(scraper_renov, "RENOV_RENT_RANGE", (15, 30))
+    monkeypatch.setattr(scraper_renov, "RENOV_RESULT_CAP", 50)
+    counts = {"203|15-30": 50, "203|15-22": 50, "203|22-30": 10}
+    leaves, internal = plan_renov_queries(counts)
+    assert [q.key for q in leaves] == ["203|15-18", "203|18-22", "203|22-30"]
+    assert [q.key for q in internal] == ["203|15-30", "203|15-22"]
+
+
+def test_plan_respects_request_budget(monkeypatch):
+    monkeypatch.setattr(scraper_renov, "RENOV_MADORI_CODES", ["203", "205"])
+    monkeypatch.setattr(scraper_renov, "RENOV_RENT_RANGE", (15, 30))
+    monkeypatch.setattr(scraper_renov, "RENOV_RESULT_CAP", 50)
+    counts = {"203|15-30": 50, "205|15-30": 50, "203|15-22": 50, "203|22-30": 50}
+    leaves, _ = plan_renov_queries(counts, budget=3)
+    assert len(leaves) == 3
+
+
+def test_truncated_band_carries_over_saved_listings(monkeypatch, tmp_path):
+    monkeypatch.setattr(scraper_renov, "RENOV_MADORI_CODES", ["203"])
+    monkeypatch.setattr(scraper_renov, "RENOV_RENT_RANGE", (15, 16))
+    monkeypatch.setattr(scraper_renov, "RENOV_RESULT_CAP", 2)
+    monkeypatch.setattr(scraper_renov, "RENOV_SHARD_COUNTS_FILE", tmp_path / "counts.json")
+    requests = []
+
+    def fake_fetch(query: RenovQuery) -> list[Property]:
+        requests.append(query.key)
+        return [prop("a", "150,000円"), prop("b", "155,000円")]
+
+    monkeypatch.setattr(scraper_renov, "fetch_renov_query", fake_fetch)
+    saved = {
+        "a": prop("a", "150,000円"),
+        "c": prop("c", "158,000円"),  # 打ち切りで取得できなかった物件
+        "d": prop("d", "250,000円"),  # 打ち切られた賃料帯の外の物件は掲載終了
+    }
+    properties = scraper_renov.fetch_renov_properties(saved)
+    assert [p.id for p in properties] == ["a", "b", "c"]
+    assert requests == ["203|15-16"]
+
+
+def test_capped_queries_are_split_within_request_limit(monkeypatch, tmp_path):
+    monkeypatch.setattr(scraper_renov, "RENOV_MADORI_CODES", ["203"])
+    monkeypatch.setattr(scraper_renov, "RENOV_RENT_RANGE", (15, 30))
+    monkeypatch.setattr(scraper_renov, "RENOV_RESULT_CAP", 1)
+    monkeypatch.setattr(scraper_renov, "RENOV_MAX_REQUESTS_PER_CYCLE", 5)
+    monkeypatch.setattr(scraper_renov, "RENOV_SHARD_COUNTS_FILE", tmp_path / "counts.json")
+    requests = []
+
+    def fake_fetch(query: RenovQuery) -> list[Property]:
+        requests.append(query.key)
+        return [prop(query.key, f"{query.price_from * 10000:,}円")]
+
+    monkeypatch.setattr(scraper_renov, "fetch_renov_query", fake_fetch)
+    scraper_renov.fetch_renov_properties({})
+    assert len(requests) <= 5
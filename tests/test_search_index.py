@@ -0,0 +1,46 @@
+"""全文検索インデックスのテスト"""
+from search_index import SearchIndex, doc_key, parse_query, tokenize
+from scraper import Property
+
+
+def prop(property_id: str, description: str) -> Property:
+    return Property(
+        id=property_id, title="", location="", rent="20万円", area="50㎡",
+        station="", url=f"https://example.com/{property_id}", description=description,
+    )
+
+
+def build(*properties: Property) -> SearchIndex:
+    index = SearchIndex()
+    index.update("renov", properties)
+    return index
+
+
+def test_tokenize_splits_normalized_bigrams():
+    assert tokenize("ペット可") == {"ペッ", "ット", "ト可"}
+    assert tokenize("Ａ") == {"a"}
+    assert tokenize("") == set()
+
+
+def test_parse_query_keeps_quoted_phrases():
+    assert parse_query('ペット "ルーフ バルコニー"') == ["ペット", "ルーフバルコニー"]
+
+
+def test_search_requires_all_terms():
+    index = build(prop("1", "ペット可 ルーフバルコニー付き"), prop("2", "ペット可 南向き"))
+    assert index.search("ペット ルーフバルコニー") == [doc_key("renov", "1")]
+    assert index.search("ペット") == [doc_key("renov", "1"), doc_key("renov", "2")]
+
+
+def test_search_phrase_matches_contiguous_text_only():
+    index = build(prop("1", "ルーフ バルコニー"), prop("2", "バルコニーとルーフ"))
+    assert index.search('"ルーフ バルコニー"') == [doc_key("renov", "1")]
+    assert index.search("ルーフ バルコニー") == [doc_key("renov", "1"), doc_key("renov", "2")]
+
+
+def test_unchanged_document_is_not_returned_until_marked_pending():
+    index = build(prop("1", "ペット可"))
+    assert index.update("renov", [prop("1", "ペット可")]) == []
+    index.mark_pending("renov", ["1"])
+    assert index.update("renov", [prop("1", "ペット可")]) == [doc_key("renov", "1")]
+    assert index.update("renov", [prop("1", "ペット可")]) == []
@@ -0,0 +1,42 @@
+"""駅座標の空間インデックスのテスト"""
+import random
+
+from stations import GeoGrid, distance_km
+
+
+def random_points(count: int, seed: int = 0) -> list[tuple[float, float, int]]:
+    rng = random.Random(seed)
+    return [(rng.uniform(35.5, 35.8), rng.uniform(139.5, 139.9), i) for i in range(count)]
+
+
+def build(points) -> GeoGrid[int]:
+    grid: GeoGrid[int] = GeoGrid(cell_degrees=0.01)
+    for lat, lon, item in points:
+        grid.insert(lat, lon, item)
+    return grid
+
+
+def test_within_matches_brute_force():
+    points = random_points(500)
+    grid = build(points)
+    for lat, lon, _ in random_points(20, seed=1):
+        expected = sorted(
+            (distance_km(lat, lon, p_lat, p_lon), item)
+            for p_lat, p_lon, item in points
+            if distance_km(lat, lon, p_lat, p_lon) <= 2.0
+        )
+        assert sorted(grid.within(lat, lon, 2.0)) == expected
+
+
+def test_nearest_matches_brute_force():
+    points = random_points(500)
+    grid = build(points)
+    for lat, lon, _ in random_points(20, seed=2):
+        expected = min((distance_km(lat, lon, p_lat, p_lon), item) for p_lat, p_lon, item in points)
+        assert grid.nearest(lat, lon) == expected
+
+
+def test_nearest_searches_beyond_adjacent_cells():
+    grid = build([(35.0, 139.0, 1)])
+    assert grid.nearest(35.5, 139.5)[1] == 1
+    assert GeoGrid().nearest(35.0, 139.0) is None
@@ -0,0 +1,180 @@
+"""物件サムネイルの取得とキャッシュモジュール
+
+新着物件のサムネイル画像を並行に取得し、縮小してディスク上のLRUキャッシュに保存する。
+キャッシュのキーは (サイト, 物件ID, 画像URLのハッシュ) で、再送やリトライ時には再取得しない。
+縮小には Pillow を使う（インストールされていない場合はJPEG画像のみ元画像のまま保存する）。
+キャッシュは配信サーバーの /thumbnails/ から公開するためのもので、公開URLが未設定の場合は取得しない。
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+from config import (
+    THUMBNAIL_CACHE_DIR,
+    THUMBNAIL_CACHE_MAX_BYTES,
+    THUMBNAIL_MAX_SIZE,
+    THUMBNAIL_MAX_WORKERS,
+    THUMBNAIL_PUBLIC_BASE_URL,
+    LINE_RICH_MESSAGES,
+)
+from scraper import Property
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail_key(site: str, property_id: str, image_url: str) -> str:
+    """キャッシュのファイル名"""
+    digest = hashlib.sha1(image_url.encode("utf-8")).hexdigest()[:16]
+    safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in property_id)
+    return f"{site}_{safe_id}_{digest}.jpg"
+
+
+def resize_image(data: bytes) -> bytes:
+    """画像を縮小してJPEGに変換（Pillowがない場合はJPEG画像のみそのまま返す）"""
+    if Image is None:
+        # キャッシュは .jpg として image/jpeg で配信するため、変換できない形式は保存しない
+        if not data.startswith(b"\xff\xd8"):
+            raise ValueError("JPEG以外の画像はPillowがないと変換できません")
+        return data
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        image.thumbnail(THUMBNAIL_MAX_SIZE)
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=80, optimize=True)
+        return output.getvalue()
+
+
+class ThumbnailCache:
+    """容量上限付きのディスクLRUキャッシュ（最終利用時刻はファイルの更新時刻で管理）"""
+
+    def __init__(self, directory: Path = THUMBNAIL_CACHE_DIR, max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str) -> Path:
+        return self.directory / key
+
+    def get(self, key: str) -> Optional[Path]:
+        """キャッシュ済みならパスを返し、最終利用時刻を更新"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, data: bytes) -> Path:
+        """画像を保存し、容量上限を超えた分を古い順に削除"""
+        path = self.path(key)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+        return path
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".jpg"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+def _download(url: str) -> bytes:
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+    }
+    response = requests.get(url, headers=headers, timeout=15)
+    response.raise_for_status()
+    return resize_image(response.content)
+
+
+def fetch_thumbnails(
+    site: str, properties: list[Property], cache: Optional[ThumbnailCache] = None
+) -> dict[str, Path]:
+    """新着物件のサムネイルを取得し、物件IDごとのキャッシュのパスを返す"""
+    cache = cache or ThumbnailCache()
+    paths: dict[str, Path] = {}
+    pending: dict[str, tuple[str, list[str]]] = {}
+
+    for prop in properties:
+        if not prop.image_url:
+            continue
+        key = thumbnail_key(site, prop.id, prop.image_url)
+        cached = cache.get(key)
+        if cached:
+            paths[prop.id] = cached
+        else:
+            # 同じ物件が複数回含まれていても1回だけ取得する
+            pending.setdefault(key, (prop.image_url, []))[1].append(prop.id)
+
+    if not pending:
+        return paths
+
+    cached_count = len(paths)
+    with ThreadPoolExecutor(max_workers=min(THUMBNAIL_MAX_WORKERS, len(pending))) as executor:
+        futures = {key: executor.submit(_download, url) for key, (url, _) in pending.items()}
+        for key, future in futures.items():
+            try:
+                path = cache.put(key, future.result())
+            except Exception as e:
+                logger.warning(f"サムネイルの取得に失敗: {pending[key][0]} {e}")
+                continue
+            for property_id in pending[key][1]:
+                paths[property_id] = path
+
+    logger.info(f"サムネイルを取得しました: {len(pending)}件（キャッシュ済み {cached_count}件）")
+    return paths
+
+
+def thumbnail_urls(properties: list[Property], paths: dict[str, Path]) -> dict[str, str]:
+    """通知に使う画像URL（公開URLが設定されていれば縮小版、なければ元画像）"""
+    urls = {}
+    for prop in properties:
+        path = paths.get(prop.id)
+        if path and THUMBNAIL_PUBLIC_BASE_URL:
+            urls[prop.id] = f"{THUMBNAIL_PUBLIC_BASE_URL.rstrip('/')}/thumbnails/{path.name}"
+        elif prop.image_url.startswith("https://"):
+            # LINEの画像URLはHTTPSのみ
+            urls[prop.id] = prop.image_url
+    return urls
+
+
+def prepare_thumbnails(site: str, properties: list[Property]) -> dict[str, str]:
+    """新着通知用にサムネイルを取得し、物件IDごとの画像URLを返す"""
+    if not LINE_RICH_MESSAGES or not properties:
+        return {}
+    if not THUMBNAIL_PUBLIC_BASE_URL:
+        # 縮小版を公開できないため元画像のURLをそのまま使う（取得・キャッシュは不要）
+        return thumbnail_urls(properties, {})
+    return thumbnail_urls(properties, fetch_thumbnails(site, properties))